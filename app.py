@@ -1,14 +1,31 @@
+import gc
+import json
 import os
-from requests import get
+import time
+from datetime import datetime, timezone
+from itertools import chain
+import click
+from requests import get, RequestException
 from dotenv import load_dotenv
 from modules.dietcraft import DietCraft
-from flask import Flask, render_template, redirect, url_for, flash, request
+from modules.recipe_cache import RecipeCache
+from modules.corpus import RecipeCorpus
+from modules.migrations import run_migrations
+from modules.plans import (
+    meal_plan_rows, plan_entries, replace_meal_plans, replace_meal_slots, weekly_meals_from_plans, on_replace,
+    plan_history, archived_plan, RenderedPlanCache,
+)
+from modules import shopping
+from modules.requirements import current_requirements
+from modules import jobs, metrics, profiling, storage
+from modules.jobs import JobQueue
+from flask import Flask, Blueprint, current_app, render_template, redirect, url_for, flash, request, session, jsonify, g, Response
 from flask_bootstrap import Bootstrap5
 from flask_ckeditor import CKEditor
 from flask_login import UserMixin, login_user, LoginManager, current_user, logout_user, login_required
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, Float, String, LargeBinary, ForeignKey, text
 from werkzeug.security import generate_password_hash, check_password_hash
 from modules.forms import RegisterForm, LoginForm, SettingsForm, CustomMealForm
 
@@ -22,17 +39,37 @@ base_dir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(base_dir, 'data', 'diet.db')
 os.makedirs(os.path.dirname(db_path), exist_ok=True)  # Ensure 'data' folder exists
 
-# Initialize the Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'secrets123456789'
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-db = SQLAlchemy(app)
-ckeditor = CKEditor(app)
-Bootstrap5(app)
+# Recipe pool cache and optional local corpus, opened by create_app()
+recipe_cache = None
+recipe_corpus = None
+recipe_backend = os.getenv("RECIPE_BACKEND", "spoonacular")
+recipe_corpus_path = os.getenv("RECIPE_CORPUS_PATH", os.path.join(base_dir, 'data', 'recipes.db'))
 
-# Configure Flask-Login
+# Shopping lists, kept per plan and dropped when the plan is regenerated
+shopping_lists = shopping.ShoppingListCache()
+on_replace(shopping_lists.invalidate)
+
+# JSON renderings of each user's plan for /api/plan, dropped when the plan is regenerated
+rendered_plans = RenderedPlanCache()
+on_replace(rendered_plans.invalidate)
+
+# Shown when Spoonacular (or the local corpus) can't be reached; the details go to the server log only
+RECIPES_UNAVAILABLE = "Recipes are unavailable right now, please try again later."
+
+# SQLite PRAGMAs (see modules/storage.py); "default" leaves SQLite's own settings alone
+storage_profile = os.getenv("DB_PROFILE", "production")
+
+# Extensions; bound to the app in create_app()
+db = SQLAlchemy()
+ckeditor = CKEditor()
+bootstrap = Bootstrap5()
 login_manager = LoginManager()
-login_manager.init_app(app)
+
+# Routes and CLI commands (cli_group=None keeps `flask regenerate-plans` etc. at the top level)
+bp = Blueprint("main", __name__, cli_group=None)
+
+# Database URIs whose schema was already created/migrated in this process
+_schema_ready = set()
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -60,6 +97,8 @@ class User(UserMixin, db.Model):
     #Requirements
     calorie_requirement: Mapped[int] = mapped_column(Integer, nullable=True)
     protein_requirement: Mapped[int] = mapped_column(Integer, nullable=True)
+    requirements_fingerprint: Mapped[str] = mapped_column(String(40), nullable=True)  # settings the above were computed from
+    plan_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")  # bumped on every plan rewrite
 
      # Relationship to MealPlan
     meal_plans: Mapped[list["MealPlan"]] = relationship("MealPlan", back_populates="user")
@@ -71,9 +110,11 @@ class MealPlan(db.Model):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     day: Mapped[str] = mapped_column(String(20))  # e.g., "Day 1", "Day 2"
     meal_type: Mapped[str] = mapped_column(String(20))  # e.g., "breakfast", "lunch"
-    title: Mapped[str] = mapped_column(String(255))
-    calories: Mapped[int] = mapped_column(Integer)
-    protein: Mapped[int] = mapped_column(Integer)
+    recipe_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipes.id"), nullable=True)  # None for custom meals
+    # Only set for meals without a recipe (snack, placeholders); recipes keep theirs in the recipes table
+    title: Mapped[str] = mapped_column(String(255), nullable=True)
+    calories: Mapped[int] = mapped_column(Integer, nullable=True)
+    protein: Mapped[int] = mapped_column(Integer, nullable=True)
     url: Mapped[str] = mapped_column(String(255), nullable=True)
     custom_meal_title: Mapped[str] = mapped_column(String(255), nullable=True)
     custome_meal_calories: Mapped[int] = mapped_column(Integer, nullable=True)
@@ -81,22 +122,153 @@ class MealPlan(db.Model):
 
     # Relationship back to User
     user: Mapped["User"] = relationship("User", back_populates="meal_plans")
+    recipe: Mapped["Recipe"] = relationship("Recipe")
+
+    # Every profile load filters on user_id; day/meal_type keep the plan in index order
+    __table_args__ = (db.Index("ix_meal_plans_user_day_meal", "user_id", "day", "meal_type"),)
+
+class Recipe(db.Model):
+    __tablename__ = "recipes"
+
+    # One row per Spoonacular recipe, shared by every plan that uses it
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # Spoonacular id
+    title: Mapped[str] = mapped_column(String(255))
+    url: Mapped[str] = mapped_column(String(255), nullable=True)
+    calories: Mapped[float] = mapped_column(Float)
+    protein: Mapped[float] = mapped_column(Float)
+
+class PlanArchive(db.Model):
+    __tablename__ = "plan_archives"
+
+    # Earlier plans, one compressed snapshot per replaced version (see modules/plans.py)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    version: Mapped[int] = mapped_column(Integer)  # plan_version the plan had when it was replaced
+    archived_at: Mapped[float] = mapped_column(Float)  # Unix time
+    meal_count: Mapped[int] = mapped_column(Integer)
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+
+    # History pages are keyset scans over this index, newest version first
+    __table_args__ = (db.Index("ix_plan_archives_user_version", "user_id", "version", unique=True),)
+
+class GenerationJob(db.Model):
+    __tablename__ = "generation_jobs"
+
+    # /generate jobs, shared by every worker process (see modules/jobs.py)
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    key: Mapped[int] = mapped_column(Integer)  # user id
+    status: Mapped[str] = mapped_column(String(10))
+    error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[float] = mapped_column(Float)  # Unix time
+    finished_at: Mapped[float] = mapped_column(Float, nullable=True)
+
+    # At most one queued or running job per user, whichever process took the request
+    __table_args__ = (
+        db.Index("ix_generation_jobs_pending_key", "key", unique=True,
+                 sqlite_where=text("status IN ('queued', 'running')"),
+                 postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+# Background workers for /generate; job state lives in generation_jobs
+generation_jobs = JobQueue(GenerationJob, max_workers=int(os.getenv("GENERATION_WORKERS", 2)))
+
+
+def init_schema(app):
+    """Creates tables and applies migrations, once per database per process."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri in _schema_ready:
+        return
+    with app.app_context():
+        db.create_all()
+        run_migrations(db.engine)
+    _schema_ready.add(uri)
+
+
+def create_app():
+    """
+    Builds and configures the Flask app.
+
+    Nothing heavy happens at import time: the recipe stores are opened and the schema is created
+    here, and pandas/BeautifulSoup are only imported by the code paths that use them. Under
+    gunicorn (see gunicorn.conf.py) this runs once in the master, before the workers fork.
+    """
+    global recipe_cache, recipe_corpus
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secrets123456789'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", f'sqlite:///{db_path}')
+    # One pooled connection per request thread and /generate worker, with room to spare
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage.engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 5)),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    )
+    db.init_app(app)
+    with app.app_context():
+        storage.configure_engine(db.engine, storage_profile)
+    ckeditor.init_app(app)
+    bootstrap.init_app(app)
+    login_manager.init_app(app)
+
+    # Cache of Spoonacular recipe pools, shared by users with similar targets
+    if recipe_cache is None:
+        recipe_cache = RecipeCache(
+            os.getenv("RECIPE_CACHE_PATH", os.path.join(base_dir, 'data', 'recipe_cache.db')),
+            ttl=int(os.getenv("RECIPE_CACHE_TTL", 24 * 60 * 60)),
+            max_entries=int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", 500)),
+        )
+    # Recipe search backend: the live Spoonacular API, or a local corpus loaded with `flask load-recipes`
+    if recipe_backend == "local" and recipe_corpus is None:
+        recipe_corpus = RecipeCorpus(recipe_corpus_path)
+
+    app.register_blueprint(bp)
+
+    # Sampled profiling of the routes named in PROFILE_TARGETS; other routes are left as they are
+    if profiling.ENABLED:
+        profiling.wrap_views(app)
+
+    # Request timing, only registered when METRICS_ENABLED=1
+    if metrics.ENABLED:
+        app.before_request(start_request_timer)
+        app.after_request(record_request_time)
+
+    init_schema(app)
+    return app
 
 
-with app.app_context():
-    db.create_all()
+def warm_up(app):
+    """
+    Pre-fork warm-up: loads everything a worker would otherwise load on its first requests, then
+    moves the heap out of the garbage collector's reach so forked workers keep sharing it
+    copy-on-write instead of touching every page on their first collection.
+    """
+    import bs4  # noqa: F401
+    import pandas  # noqa: F401
 
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
 
-@app.route('/')
+    # Pooled connections, and the corpus's own SQLite connection, must not be shared across the fork
+    with app.app_context():
+        db.engine.dispose()
+    if recipe_corpus is not None:
+        recipe_corpus.close()
+
+    gc.collect()
+    gc.freeze()
+
+
+@bp.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/question1')
+@bp.route('/question1')
 def question_1():
     return render_template('question_1.html')
 
 # Register new users into the User database
-@app.route('/register', methods=["GET", "POST"])
+@bp.route('/register', methods=["GET", "POST"])
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
@@ -107,7 +279,7 @@ def register():
         if user:
             # User already exists
             flash("You've already signed up with that email, log in instead!")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         hash_and_salted_password = generate_password_hash(
             form.password.data,
@@ -125,11 +297,11 @@ def register():
 
         # This line will authenticate the user with Flask-Login
         login_user(new_user)
-        return redirect(url_for("profile"))
+        return redirect(url_for("main.profile"))
     return render_template("register.html", form=form, current_user=current_user)
 
 
-@app.route('/login', methods=["GET", "POST"])
+@bp.route('/login', methods=["GET", "POST"])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
@@ -140,18 +312,18 @@ def login():
         # Email doesn't exist
         if not user:
             flash("That email does not exist, please try again.")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         # Password incorrect
         elif not check_password_hash(user.password, password):
             flash('Password incorrect, please try again.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         else:
             login_user(user)
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
 
     return render_template("login.html", form=form, current_user=current_user)
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     form = SettingsForm()
@@ -159,6 +331,7 @@ def profile():
     # Initialize variables to avoid UnboundLocalError
     calorie_requirement = None
     protein_requirement = None
+    generate_job = None
 
     if request.method == 'GET':
         # Pre-fill form with the user's current settings
@@ -172,26 +345,27 @@ def profile():
         form.time_frame.data = current_user.time_frame
         form.goal.data = current_user.goal
 
-        # Calculate requirements for the initial GET request (optional)
+        # Serve the stored requirements snapshot; only recomputed when the settings changed
         if current_user.age and current_user.current_weight:
-            calorie_requirement = DietCraft.generate_calorie_requirements(
-                age=current_user.age,
-                gender=current_user.gender,
-                height_feet=current_user.height_feet,
-                height_inch=current_user.height_inches or 0,
-                weight=current_user.current_weight,
-                desired_weight=current_user.desired_weight,
-                time_frame=current_user.time_frame,
-                activity=current_user.activity_level,
-            )
-
-            protein_requirement = DietCraft.generate_protein_requirements(
-                goal=current_user.goal,
-                weight=current_user.current_weight,
-            )
+            calorie_requirement, protein_requirement, changed = current_requirements(current_user)
+            if changed:
+                db.session.commit()
+
+        # Report on a background generation started from this session
+        if 'generate_job' in session:
+            job = generation_jobs.get(db.engine, session['generate_job'])
+            if job is None or job.status == jobs.DONE:
+                session.pop('generate_job')
+                if job is not None:
+                    flash("Meals Generated and Saved")
+            elif job.status == jobs.FAILED:
+                session.pop('generate_job')
+                flash(f"Error: Meal generation failed ({job.error})")
+            else:
+                generate_job = job
 
          # Get meals for the current user
-        meals = MealPlan.query.filter_by(user_id=current_user.id).all()
+        meals = plan_entries(db.session, MealPlan, Recipe, current_user.id)
 
     if form.validate_on_submit():
         # Update user settings in the database
@@ -205,26 +379,8 @@ def profile():
         current_user.time_frame = form.time_frame.data
         current_user.goal = form.goal.data
 
-        # Recalculate requirements after the form submission
-        calorie_requirement = DietCraft.generate_calorie_requirements(
-            age=current_user.age,
-            gender=current_user.gender,
-            height_feet=current_user.height_feet,
-            height_inch=current_user.height_inches or 0,
-            weight=current_user.current_weight,
-            desired_weight=current_user.desired_weight,
-            time_frame=current_user.time_frame,
-            activity=current_user.activity_level,
-        )
-
-        protein_requirement = DietCraft.generate_protein_requirements(
-            goal=current_user.goal,
-            weight=current_user.current_weight,
-        )
-
-        # Save calorie and protein requirements to the database
-        current_user.calorie_requirement = calorie_requirement
-        current_user.protein_requirement = protein_requirement
+        # Recalculate requirements after the form submission and save them with the settings fingerprint
+        calorie_requirement, protein_requirement, _ = current_requirements(current_user)
 
         if calorie_requirement == "Not Suggested":
             flash("Your Settings have not been Updated!")
@@ -233,7 +389,7 @@ def profile():
             flash("Your Settings have been Updated!")
             db.session.commit()  
 
-        return redirect(url_for('profile'))  # Redirect to refresh the page with saved data
+        return redirect(url_for('main.profile'))  # Redirect to refresh the page with saved data
 
     return render_template(
         "profile.html",
@@ -242,9 +398,10 @@ def profile():
         calorie_requirement=calorie_requirement,
         protein_requirement=protein_requirement,
         meals=meals,
+        generate_job=generate_job,
     )
 
-@app.route('/add_meal', methods=['GET', 'POST'])
+@bp.route('/add_meal', methods=['GET', 'POST'])
 @login_required
 def add_meal():
     form = CustomMealForm()
@@ -259,10 +416,34 @@ def add_meal():
         current_user.custom_calories = form.calories
         current_user.custom_protein = form.process
 
-    return redirect(url_for('profile'))  # Redirect to refresh the page with saved data
+    return redirect(url_for('main.profile'))  # Redirect to refresh the page with saved data
 
 
-@app.route('/generate', methods=['GET'])
+def build_meal_plan(app, user_id, daily_calories, daily_protein, goal):
+    """Background job: generates a user's week and swaps it into the MealPlan table."""
+    with app.app_context():
+        try:
+            result = DietCraft.generate_weekly_meals(
+                api_key=spoonacular_api_key,
+                daily_calories=daily_calories,
+                daily_protein=daily_protein,
+                goal=goal,
+                cache=recipe_cache if recipe_corpus is None else None,
+                search=recipe_corpus.complex_search if recipe_corpus is not None else None,
+            )
+        except RequestException as e:
+            raise jobs.JobError(RECIPES_UNAVAILABLE) from e
+
+        # Swap the old plan for the new one in a single transaction
+        replace_meal_plans(db.session, MealPlan, [user_id], meal_plan_rows(user_id, result), User=User, Recipe=Recipe,
+                           PlanArchive=PlanArchive)
+
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+
+@bp.route('/generate', methods=['GET'])
 @login_required
 def generate_meals():
     if (
@@ -274,50 +455,295 @@ def generate_meals():
             # Ensure calorie and protein requirements are numeric
             daily_calories = float(current_user.calorie_requirement)
             daily_protein = float(current_user.protein_requirement)
+        except ValueError:
+            flash("Error: Invalid calorie or protein requirement.")
+            return redirect(url_for('main.profile'))
 
-            # Delete existing meal plans for the current user
-            MealPlan.query.filter_by(user_id=current_user.id).delete()
-            db.session.commit()  # Commit the deletion to ensure a clean slate
+        # Queue the generation; a second click while it runs gets the same job back
+        job = generation_jobs.submit(
+            db.engine, current_user.id, build_meal_plan, current_app._get_current_object(),
+            current_user.id, daily_calories, daily_protein, current_user.goal,
+        )
+        session['generate_job'] = job.id
 
-            # Call the function to generate meals
-            result = DietCraft.generate_weekly_meals(
-                api_key=spoonacular_api_key,
-                daily_calories=daily_calories,
-                daily_protein=daily_protein,
-                goal=current_user.goal,
-            )
+        if wants_json():
+            return jsonify(job.to_dict()), 202
+        flash("Generating your meal plan...")
+        return redirect(url_for('main.profile'))
+    else:
+        flash("Error: Some required fields are missing.")
+        return redirect(url_for('main.profile'))
 
-            # Store the result in the MealPlan table
-            for day, daily_meals in result.items():
-                for meal_type, details in daily_meals.items():
-                    meal_plan = MealPlan(
-                        user_id=current_user.id,
-                        day=day,
-                        meal_type=meal_type,
-                        title=details["title"],
-                        calories=details["calories"],
-                        protein=details["protein"],
-                        url=details["url"],
-                    )
-                    db.session.add(meal_plan)
-
-            db.session.commit()  # Commit the new meal plan to the database
-
-            flash("Meals Generated and Saved")
-            return redirect(url_for('profile'))
 
-        except ValueError:
-            flash("Error: Invalid calorie or protein requirement.")
-            return redirect(url_for('profile'))
+@bp.route('/generate/<int:day>', methods=['POST'])
+@bp.route('/generate/<int:day>/<meal>', methods=['POST'])
+@login_required
+def regenerate(day, meal=None):
+    """Re-picks one day, or one meal slot of a day, and rewrites just those MealPlan rows."""
+    meal_plans = plan_entries(db.session, MealPlan, Recipe, current_user.id)
+    if not meal_plans or current_user.calorie_requirement is None or current_user.protein_requirement is None:
+        flash("Generate a meal plan first.")
+        return redirect(url_for('main.profile'))
+
+    try:
+        meals = DietCraft.regenerate_meals(
+            api_key=spoonacular_api_key,
+            weekly_meals=weekly_meals_from_plans(meal_plans),
+            day=f"Day {day}",
+            daily_calories=float(current_user.calorie_requirement),
+            daily_protein=float(current_user.protein_requirement),
+            goal=current_user.goal,
+            meal=meal,
+            cache=recipe_cache if recipe_corpus is None else None,
+            search=recipe_corpus.complex_search if recipe_corpus is not None else None,
+        )
+    except ValueError as e:
+        if wants_json():
+            return jsonify({"error": str(e)}), 404
+        flash(f"Error: {e}")
+        return redirect(url_for('main.profile'))
+    except RequestException:
+        if wants_json():
+            return jsonify({"error": RECIPES_UNAVAILABLE}), 503
+        flash(f"Error: {RECIPES_UNAVAILABLE}")
+        return redirect(url_for('main.profile'))
+
+    replace_meal_slots(db.session, MealPlan, current_user.id,
+                       meal_plan_rows(current_user.id, {f"Day {day}": meals}), User=User, Recipe=Recipe)
+
+    if wants_json():
+        return jsonify(meals)
+    flash(f"Day {day} {meal} regenerated" if meal else f"Day {day} regenerated")
+    return redirect(url_for('main.profile'))
+
+
+@bp.route('/api/plan')
+@login_required
+def plan_api():
+    """
+    The current plan as JSON. The ETag is the user's plan_version, so a client polling with
+    If-None-Match gets a 304 without the plan being read; otherwise the body comes from the
+    per-user rendered-plan cache, which is rebuilt only after the plan changes.
+    """
+    version = current_user.plan_version or 0
+    etag = f"{current_user.id}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-        flash("Error: Some required fields are missing.")
-        return redirect(url_for('profile'))
+        body = rendered_plans.get(current_user.id, version)
+        if body is None:
+            meal_plans = plan_entries(db.session, MealPlan, Recipe, current_user.id)
+            body = json.dumps({"version": version, "days": weekly_meals_from_plans(meal_plans)})
+            rendered_plans.set(current_user.id, version, body)
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# Most archived plans /api/plan/history returns per page
+MAX_HISTORY_PAGE = 100
+
+
+@bp.route('/api/plan/history')
+@login_required
+def plan_history_api():
+    """
+    The user's earlier plans, newest first, a page at a time (?limit=N, default 20). Pages are
+    keyset-paginated: pass the `next` value of one page as ?before= to get the following one.
+    """
+    limit = max(1, min(request.args.get("limit", type=int, default=20), MAX_HISTORY_PAGE))
+    rows, next_before = plan_history(db.session, PlanArchive, current_user.id,
+                                     before=request.args.get("before", type=int), limit=limit)
+    return jsonify({
+        "plans": [
+            {
+                "version": row.version,
+                "archived_at": datetime.fromtimestamp(row.archived_at, timezone.utc).isoformat(),
+                "meals": row.meal_count,
+            }
+            for row in rows
+        ],
+        "next": next_before,
+    })
+
+
+@bp.route('/api/plan/history/<int:version>')
+@login_required
+def archived_plan_api(version):
+    """One archived plan. Archived plans never change, so clients may cache them for good."""
+    etag = f"{current_user.id}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        days = archived_plan(db.session, PlanArchive, Recipe, current_user.id, version)
+        if days is None:
+            return jsonify({"error": f"No archived plan version {version}"}), 404
+        response = jsonify({"version": version, "days": days})
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+# Longest horizon /generate/stream plans in one response
+MAX_STREAM_DAYS = 2 * 365
+
+
+@bp.route('/generate/stream')
+@login_required
+def stream_meals():
+    """
+    Streams a plan over the user's whole time frame (or ?days=N), one day at a time, as NDJSON
+    or, with ?format=json, as a JSON array. The plan is not stored.
+    """
+    if current_user.calorie_requirement is None or current_user.protein_requirement is None:
+        return jsonify({"error": "Some required fields are missing."}), 400
+    days = request.args.get("days", type=int, default=7 * (current_user.time_frame or 1))
+    days = max(1, min(days, MAX_STREAM_DAYS))
+
+    plan = DietCraft.stream_meal_plan(
+        api_key=spoonacular_api_key,
+        daily_calories=float(current_user.calorie_requirement),
+        daily_protein=float(current_user.protein_requirement),
+        goal=current_user.goal,
+        days=days,
+        cache=recipe_cache if recipe_corpus is None else None,
+        search=recipe_corpus.complex_search if recipe_corpus is not None else None,
+    )
+    # Fetch the pools and solve day 1 before responding, so upstream errors still get a status code
+    try:
+        first = next(plan)
+    except RequestException:
+        return jsonify({"error": RECIPES_UNAVAILABLE}), 503
+
+    def entries():
+        for day, meals in chain([first], plan):
+            yield json.dumps({"day": day, "meals": meals})
+
+    if request.args.get("format") == "json":
+        def body():
+            separator = "["
+            for entry in entries():
+                yield separator + entry
+                separator = ","
+            yield "]"
+        return Response(body(), mimetype="application/json")
+    return Response((entry + "\n" for entry in entries()), mimetype="application/x-ndjson")
+
+
+@bp.route('/generate/status/<job_id>')
+@login_required
+def generate_status(job_id):
+    job = generation_jobs.get(db.engine, job_id)
+    if job is None or job.key != current_user.id:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@bp.route('/shopping_list')
+@login_required
+def shopping_list():
+    rows = db.session.execute(
+        db.select(MealPlan.day, MealPlan.meal_type, MealPlan.recipe_id).where(MealPlan.user_id == current_user.id)
+    ).all()
+    if not rows:
+        flash("Generate a meal plan first to get a shopping list.")
+        return redirect(url_for('main.profile'))
+
+    # One cached list per plan; regenerating the plan gives it a new key
+    plan = shopping.plan_frame(rows)
+    key = shopping.plan_key(plan)
+    items = shopping_lists.get(current_user.id, key)
+    if items is None:
+        try:
+            items = DietCraft.generate_shopping_list(
+                plan,
+                api_key=spoonacular_api_key,
+                information_bulk=recipe_corpus.information_bulk if recipe_corpus is not None else None,
+            ).to_dict("records")
+        except RequestException:
+            flash("Error: Could not load ingredients, please try again later.")
+            return redirect(url_for('main.profile'))
+        shopping_lists.set(current_user.id, key, items)
+
+    if wants_json():
+        return jsonify(items)
+    return render_template("shopping_list.html", current_user=current_user, items=items)
+
+
+@bp.cli.command("regenerate-plans")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+@click.option("--chunk-size", type=int, default=500, help="Users read and written per batch.")
+@click.option("--checkpoint", default=os.path.join(base_dir, 'data', 'regenerate_checkpoint.json'),
+              help="Progress file used to resume an interrupted run.")
+def regenerate_plans(workers, chunk_size, checkpoint):
+    """Regenerate every user's weekly meal plan (nightly job)."""
+    from modules.batch import regenerate_all_plans
+
+    stats = regenerate_all_plans(
+        db, User, MealPlan,
+        api_key=spoonacular_api_key,
+        cache_path=recipe_cache.path,
+        checkpoint_path=checkpoint,
+        workers=workers,
+        chunk_size=chunk_size,
+        corpus_path=recipe_corpus.path if recipe_corpus is not None else None,
+        log=click.echo,
+        Recipe=Recipe,
+        PlanArchive=PlanArchive,
+    )
+    click.echo(f"Regenerated {stats['users']} users in {stats['seconds']:.1f}s "
+               f"({stats['users_per_second']:.1f} users/s)")
+
+
+@bp.cli.command("load-recipes")
+@click.argument("dump", type=click.Path(exists=True, dir_okay=False))
+def load_recipes(dump):
+    """Load a JSONL dump of Spoonacular recipes into the local recipe corpus."""
+    corpus = recipe_corpus or RecipeCorpus(recipe_corpus_path)
+    count = corpus.load_jsonl(dump)
+    click.echo(f"Loaded {count} recipes into {corpus.path} ({corpus.count()} total)")
+
+
+@bp.cli.command("compact-db")
+def compact_db():
+    """Reclaim free pages (e.g. after a migration rebuilt a table) and refresh planner statistics."""
+    # VACUUM can't run inside a transaction
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        before = conn.execute(text("PRAGMA page_count")).scalar() * page_size
+        conn.execute(text("VACUUM"))
+        conn.execute(text("ANALYZE"))
+        # In WAL mode the file only shrinks once the log is checkpointed back into it
+        if conn.execute(text("PRAGMA journal_mode")).scalar() == "wal":
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        after = conn.execute(text("PRAGMA page_count")).scalar() * page_size
+    click.echo(f"Database compacted from {before / 1e6:.1f} MB to {after / 1e6:.1f} MB")
+
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe("dietcraft_http_request_seconds", time.perf_counter() - started,
+                        endpoint=request.endpoint or "unknown", method=request.method)
+    return response
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return "Metrics are disabled", 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
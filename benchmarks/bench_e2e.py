@@ -0,0 +1,228 @@
+"""
+End-to-end benchmark for DietCraft against local stand-ins for Spoonacular and calculator.net.
+
+Starts two FakeUpstream servers (see fakes.py) with configurable latency and error rate and
+points the app at them. It then creates a throwaway database with `--users` users and drives the
+Flask app through the test client from `--concurrency` threads. For every route and DietCraft
+call it reports p50/p95/p99 latency and requests per second, and saves the results as JSON so
+runs can be compared across commits.
+
+Usage:
+    python benchmarks/bench_e2e.py [--requests 200] [--concurrency 8] [--spoonacular-latency 0.15]
+                                   [--calculator-latency 0.3] [--error-rate 0.0] [--no-cache]
+                                   [--output benchmarks/results] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeUpstream  # noqa: E402
+
+SETTINGS = dict(age=30, gender="male", height_feet=5, height_inches=10, desired_weight=170,
+                current_weight=180, activity_level="moderate", time_frame=10, goal="Lose")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(s[0] for s in samples)
+    errors = sum(1 for s in samples if not s[1])
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "rps": len(samples) / wall_seconds if wall_seconds else None,
+        "p50_ms": 1000 * percentile(latencies, 50) if latencies else None,
+        "p95_ms": 1000 * percentile(latencies, 95) if latencies else None,
+        "p99_ms": 1000 * percentile(latencies, 99) if latencies else None,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else None,
+    }
+
+
+def run_load(name, workers, total, concurrency):
+    """Runs `total` calls of workers[i]() spread over `concurrency` threads. Returns the summary."""
+    samples = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def loop(worker):
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                ok = worker()
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append((elapsed, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(loop, workers[:concurrency]))
+    summary = summarize(samples, time.perf_counter() - started)
+    print(f"{name:<40} p50 {summary['p50_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms  "
+          f"p99 {summary['p99_ms']:8.1f} ms  {summary['rps']:8.1f} req/s  errors {summary['errors']}")
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} (commit {previous.get('commit')}):")
+    for name, result in current["results"].items():
+        before = previous["results"].get(name)
+        if not before or not before.get("p95_ms") or not result.get("p95_ms"):
+            continue
+        change = 100 * (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        print(f"{name:<40} p95 {before['p95_ms']:8.1f} -> {result['p95_ms']:8.1f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--spoonacular-latency", type=float, default=0.15)
+    parser.add_argument("--calculator-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--calorie-source", choices=["local", "calculator.net"], default="local")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the recipe pool cache")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results"))
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    spoonacular = FakeUpstream(args.spoonacular_latency, args.jitter, args.error_rate, seed=1).start()
+    calculator = FakeUpstream(args.calculator_latency, args.jitter, args.error_rate, seed=2).start()
+    tmp = tempfile.TemporaryDirectory()
+
+    # The app reads its configuration at import time, so set everything up first
+    os.environ.update({
+        "SPOONACULAR_BASE_URL": spoonacular.url,
+        "SPOONACULAR_API_KEY": "benchmark",
+        "CALCULATOR_URL": f"{calculator.url}/calorie-calculator.html",
+        "CALORIE_SOURCE": args.calorie_source,
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp.name, 'bench.db')}",
+        "RECIPE_CACHE_PATH": os.path.join(tmp.name, "recipe_cache.db"),
+        "RECIPE_CACHE_TTL": "0" if args.no_cache else "86400",
+        "RECIPE_BACKEND": "spoonacular",
+    })
+    warnings.filterwarnings("ignore")
+    import app as dietcraft_app
+    from modules.dietcraft import DietCraft
+
+    flask_app = dietcraft_app.create_app()
+    flask_app.config["WTF_CSRF_ENABLED"] = False
+
+    # One logged-in client per worker thread, each with its own user
+    clients = []
+    for i in range(args.concurrency):
+        client = flask_app.test_client()
+        client.post("/register", data={"email": f"bench{i}@example.com", "password": "bench", "name": f"bench{i}"})
+        client.post("/profile", data=SETTINGS)
+        clients.append(client)
+
+    def get(client, path, expect=200):
+        return lambda: client.get(path, headers={"Accept": "application/json"}).status_code == expect
+
+    def generate(client):
+        def run():
+            job = client.get("/generate", headers={"Accept": "application/json"}).get_json()
+            while True:
+                status = client.get(f"/generate/status/{job['id']}").get_json()["status"]
+                if status in ("done", "failed"):
+                    return status == "done"
+                time.sleep(0.005)
+        return run
+
+    def poll_plan(client):
+        # Polls /api/plan like a dashboard would, revalidating with the last ETag
+        etag = {}
+
+        def run():
+            headers = {"Accept": "application/json"}
+            if "value" in etag:
+                headers["If-None-Match"] = etag["value"]
+            response = client.get("/api/plan", headers=headers)
+            if response.status_code == 200:
+                etag["value"] = response.headers["ETag"]
+            return response.status_code in (200, 304)
+        return run
+
+    def direct(fn):
+        return [fn] * args.concurrency
+
+    results = {}
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}\n")
+    results["GET /generate (until plan is ready)"] = run_load(
+        "GET /generate (until plan is ready)", [generate(c) for c in clients], args.requests, args.concurrency)
+    results["GET /profile"] = run_load(
+        "GET /profile", [get(c, "/profile") for c in clients], args.requests, args.concurrency)
+    results["GET /api/plan (If-None-Match)"] = run_load(
+        "GET /api/plan (If-None-Match)", [poll_plan(c) for c in clients], args.requests, args.concurrency)
+    results["GET /shopping_list"] = run_load(
+        "GET /shopping_list", [get(c, "/shopping_list") for c in clients], args.requests, args.concurrency)
+    results["DietCraft.generate_weekly_meals"] = run_load(
+        "DietCraft.generate_weekly_meals",
+        direct(lambda: bool(DietCraft.generate_weekly_meals("benchmark", 2200, 150, "Lose",
+                                                           cache=dietcraft_app.recipe_cache))),
+        args.requests, args.concurrency)
+    results["DietCraft.generate_calorie_requirements"] = run_load(
+        "DietCraft.generate_calorie_requirements",
+        direct(lambda: DietCraft.generate_calorie_requirements(30, "male", 5, 10, 180, 170, 10, "moderate") is not None),
+        args.requests, args.concurrency)
+    results["DietCraft.scrape_calorie_requirements"] = run_load(
+        "DietCraft.scrape_calorie_requirements",
+        direct(lambda: DietCraft.scrape_calorie_requirements(30, "male", 5, 10, 180, 170, 10, "moderate") is not None),
+        args.requests, args.concurrency)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "upstream": {
+            "spoonacular": {"requests": spoonacular.requests, "errors": spoonacular.errors},
+            "calculator": {"requests": calculator.requests, "errors": calculator.errors},
+        },
+        "results": results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nocommit'}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nUpstream calls: {report['upstream']}")
+    print(f"Saved {path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    spoonacular.stop()
+    calculator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark for the meal_plans write path and the profile query.
+
+Builds a throwaway SQLite database with `--users` users' worth of weekly plans (28 rows each),
+then measures:
+  * regenerating one user's plan: old path (delete + commit, 28 ORM adds, commit)
+    versus replace_meal_plans (one transaction, bulk insert)
+  * the profile query (all rows for one user) before and after the migration adds
+    the (user_id, day, meal_type) index
+
+Usage: python benchmarks/bench_meal_plans.py [--users 100000] [--samples 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import ForeignKey, Integer, String, create_engine, insert, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.migrations import add_meal_plan_index  # noqa: E402
+from modules.plans import replace_meal_plans  # noqa: E402
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+# Mirrors the app's tables as they were before migration 1 (the meal_plans index)
+class User(Base):
+    __tablename__ = "users"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+
+
+class MealPlan(Base):
+    __tablename__ = "meal_plans"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    day: Mapped[str] = mapped_column(String(20))
+    meal_type: Mapped[str] = mapped_column(String(20))
+    title: Mapped[str] = mapped_column(String(255))
+    calories: Mapped[int] = mapped_column(Integer)
+    protein: Mapped[int] = mapped_column(Integer)
+    url: Mapped[str] = mapped_column(String(255), nullable=True)
+
+
+MEALS = ("snack", "breakfast", "lunch", "dinner")
+
+
+def plan_rows(user_id):
+    return [
+        {
+            "user_id": user_id,
+            "day": f"Day {day}",
+            "meal_type": meal,
+            "title": f"Recipe {random.randrange(5000)}",
+            "calories": random.randrange(200, 900),
+            "protein": random.randrange(5, 60),
+            "url": None,
+        }
+        for day in range(1, 8)
+        for meal in MEALS
+    ]
+
+
+def timed(fn, samples):
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return {"mean_ms": 1000 * sum(times) / len(times), "p95_ms": 1000 * times[min(len(times) - 1, int(len(times) * 0.95))]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+
+        started = time.perf_counter()
+        with Session(engine) as session:
+            session.execute(insert(User), [{"id": i, "name": f"user{i}"} for i in range(1, args.users + 1)])
+            for first in range(1, args.users + 1, 1000):
+                rows = [row for user_id in range(first, min(first + 1000, args.users + 1)) for row in plan_rows(user_id)]
+                session.execute(insert(MealPlan), rows)
+            session.commit()
+        print(f"Seeded {args.users} users ({args.users * 28} plan rows) in {time.perf_counter() - started:.1f}s")
+
+        def profile_query(session):
+            user_id = random.randint(1, args.users)
+            return lambda: session.execute(select(MealPlan).where(MealPlan.user_id == user_id)).all()
+
+        def old_regenerate(session):
+            user_id = random.randint(1, args.users)
+
+            def run():
+                session.query(MealPlan).filter_by(user_id=user_id).delete()
+                session.commit()
+                for row in plan_rows(user_id):
+                    session.add(MealPlan(**row))
+                session.commit()
+            return run
+
+        def new_regenerate(session):
+            user_id = random.randint(1, args.users)
+            return lambda: replace_meal_plans(session, MealPlan, [user_id], plan_rows(user_id))
+
+        def measure(factory, samples):
+            with Session(engine) as session:
+                return timed(lambda: factory(session)(), samples)
+
+        # Without the index, a profile query is a full scan, so take fewer samples
+        print("profile query, no index:", measure(profile_query, max(args.samples // 50, 5)))
+        print("regenerate, old path, no index:", measure(old_regenerate, max(args.samples // 50, 5)))
+
+        # Only migration 1: the later ones (the recipe_id backfill, the recipes table rebuild)
+        # would be timed along with the index otherwise
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            add_meal_plan_index(conn)
+        print(f"index migration: {time.perf_counter() - started:.2f}s")
+
+        print("profile query, indexed:", measure(profile_query, args.samples))
+        print("regenerate, old path, indexed:", measure(old_regenerate, args.samples))
+        print("regenerate, bulk path, indexed:", measure(new_regenerate, args.samples))
+
+
+if __name__ == "__main__":
+    main()
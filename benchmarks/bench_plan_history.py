@@ -0,0 +1,133 @@
+"""
+Benchmark for plan history (plan_archives) as it grows.
+
+Builds a throwaway database through create_app() with one user per `--depths` entry, each
+with that many archived plans, and measures for each user:
+  * the profile query (plan_entries over the current plan in meal_plans)
+  * regenerating the plan, which archives the old one (replace_meal_plans with PlanArchive)
+  * the newest and the oldest page of history with keyset pagination (plan_history), and
+    the oldest page with LIMIT/OFFSET for comparison
+  * decoding one archived plan (archived_plan)
+and reports the average snapshot size.
+
+Usage: python benchmarks/bench_plan_history.py [--depths 10 1000 20000] [--samples 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MEALS = ("snack", "breakfast", "lunch", "dinner")
+
+
+def weekly_meals():
+    week = {}
+    for day in range(1, 8):
+        week[f"Day {day}"] = {"snack": {"id": None, "title": "Custom Snack", "calories": 200, "protein": 10, "url": None}}
+        for meal in MEALS[1:]:
+            recipe_id = random.randrange(1, 2000)
+            week[f"Day {day}"][meal] = {
+                "id": recipe_id,
+                "title": f"Recipe {recipe_id}",
+                "calories": 300 + recipe_id % 500,
+                "protein": 5 + recipe_id % 50,
+                "url": f"https://example.com/recipes/{recipe_id}",
+            }
+    return week
+
+
+def timed(fn, samples):
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return 1000 * sum(times) / len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 1000, 20000])
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads its configuration at import time, so set everything up first
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'history.db')}",
+            "RECIPE_CACHE_PATH": os.path.join(tmp, "recipe_cache.db"),
+        })
+        warnings.filterwarnings("ignore")
+        import app as dietcraft_app
+        from sqlalchemy import func, insert, select
+        from modules.plans import (
+            PlanEntry, archived_plan, encode_plan, meal_plan_rows, plan_entries, plan_history, replace_meal_plans,
+            split_recipes,
+        )
+
+        db, User, MealPlan, Recipe, PlanArchive = (
+            dietcraft_app.db, dietcraft_app.User, dietcraft_app.MealPlan, dietcraft_app.Recipe, dietcraft_app.PlanArchive
+        )
+        flask_app = dietcraft_app.create_app()
+
+        with flask_app.app_context():
+            session = db.session
+            for user_id, depth in enumerate(args.depths, start=1):
+                session.add(User(id=user_id, email=f"user{user_id}@example.com", password="x", name=f"user{user_id}",
+                                 plan_version=depth))
+                session.commit()
+                replace_meal_plans(session, MealPlan, [user_id], meal_plan_rows(user_id, weekly_meals()),
+                                   User=User, Recipe=Recipe)
+                # Earlier versions go straight into the archive, as replace_meal_plans would have put them
+                started = time.perf_counter()
+                for first in range(0, depth, 5000):
+                    archives = []
+                    for version in range(first, min(first + 5000, depth)):
+                        rows, _ = split_recipes(meal_plan_rows(user_id, weekly_meals()))
+                        entries = [PlanEntry(r["day"], r["meal_type"], r["recipe_id"], r["title"], r["url"],
+                                             r["calories"], r["protein"]) for r in rows]
+                        archives.append({"user_id": user_id, "version": version, "archived_at": time.time(),
+                                         "meal_count": len(entries), "payload": encode_plan(entries)})
+                    session.execute(insert(PlanArchive), archives)
+                session.commit()
+                print(f"Seeded user {user_id} with {depth} archived plans in {time.perf_counter() - started:.1f}s")
+
+            snapshot_bytes = session.scalar(select(func.avg(func.length(PlanArchive.payload))))
+            print(f"Average snapshot: {snapshot_bytes:.0f} bytes for 28 meal slots\n")
+
+            for user_id, depth in enumerate(args.depths, start=1):
+                def regenerate():
+                    replace_meal_plans(session, MealPlan, [user_id], meal_plan_rows(user_id, weekly_meals()),
+                                       User=User, Recipe=Recipe, PlanArchive=PlanArchive)
+
+                def offset_page(offset):
+                    return session.execute(
+                        select(PlanArchive.version, PlanArchive.archived_at, PlanArchive.meal_count)
+                        .where(PlanArchive.user_id == user_id)
+                        .order_by(PlanArchive.version.desc())
+                        .limit(20).offset(offset)
+                    ).all()
+
+                oldest = max(0, depth - 20)
+                results = {
+                    "profile query": timed(lambda: plan_entries(session, MealPlan, Recipe, user_id), args.samples),
+                    "regenerate + archive": timed(regenerate, max(args.samples // 10, 5)),
+                    "newest page": timed(lambda: plan_history(session, PlanArchive, user_id), args.samples),
+                    "oldest page, keyset": timed(
+                        lambda: plan_history(session, PlanArchive, user_id, before=20), args.samples),
+                    "oldest page, OFFSET": timed(lambda: offset_page(oldest), args.samples),
+                    "decode one plan": timed(
+                        lambda: archived_plan(session, PlanArchive, Recipe, user_id, random.randrange(depth)),
+                        args.samples),
+                }
+                print(f"{depth:>6} archived plans: " + ", ".join(f"{name} {ms:.2f} ms" for name, ms in results.items()))
+
+
+if __name__ == "__main__":
+    main()
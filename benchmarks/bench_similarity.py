@@ -0,0 +1,145 @@
+"""
+Benchmark for near-duplicate recipe detection (modules/similarity.py).
+
+Generates synthetic pools of `--sizes` recipes in which groups of recipes are variants of one
+dish: the same base title and ingredients, with an adjective added and an ingredient or two
+swapped. For each pool size it measures:
+  * building the MinHash/LSH index
+  * one near-duplicate lookup (SimilarityIndex.similar), which should not grow with the pool
+  * grouping the whole pool into families (SimilarityIndex.families)
+and for the smallest size compares the index against exact pairwise Jaccard similarity, which
+is quadratic in the pool size: time taken, plus the recall and precision of the index.
+Finally it times DietCraft.planner_pools on pools the size of a real fetch (3 x 100 recipes),
+both building the families and reusing them for the next plan from the same pools.
+
+Usage: python benchmarks/bench_similarity.py [--sizes 10000 50000] [--queries 2000] [--threshold 0.5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import similarity  # noqa: E402
+from modules.dietcraft import DietCraft  # noqa: E402
+from modules.recipes import RecipeStore  # noqa: E402
+from modules.similarity import SimilarityIndex, recipe_tokens  # noqa: E402
+
+PROTEINS = ["chicken", "beef", "pork", "salmon", "tofu", "shrimp", "turkey", "lentil", "egg", "tuna", "lamb", "cod"]
+BASES = ["rice", "quinoa", "noodle", "pasta", "potato", "couscous", "tortilla", "oat", "bread", "salad", "barley"]
+DISHES = ["bowl", "stir fry", "curry", "casserole", "wrap", "soup", "skillet", "bake", "salad", "stew", "taco"]
+STYLES = ["teriyaki", "thai", "greek", "mexican", "cajun", "lemon garlic", "bbq", "italian", "korean", "moroccan",
+          "indian", "pesto", "sesame", "smoky", "honey mustard", "jamaican", "spanish", "miso"]
+ADJECTIVES = ["easy", "spicy", "crispy", "creamy", "one pot", "weeknight", "zesty", "hearty", "light", "sheet pan"]
+# Made-up words standing in for the long tail of real titles ("Slow Cooker", "Harissa", ...)
+SYLLABLES = ["ka", "lo", "mi", "ze", "ru", "ta", "ne", "bo", "shi", "va", "po", "li", "dra", "gu", "fe"]
+FLAVORS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+PANTRY = ["garlic", "onion", "olive oil", "salt", "black pepper", "bell pepper", "spinach", "tomato", "carrot",
+          "ginger", "soy sauce", "lime", "cilantro", "parsley", "cumin", "paprika", "chili flakes", "broccoli",
+          "zucchini", "mushroom", "coconut milk", "yogurt", "feta", "cheddar", "avocado", "corn", "black beans",
+          "chickpeas", "kale", "cabbage", "honey", "mustard", "lemon", "basil", "oregano", "scallion"]
+
+
+def synthetic_pool(size, variants=5, seed=1):
+    """`size` recipes in groups of about `variants` near-duplicates. Returns (titles, ingredients, group)."""
+    rng = random.Random(seed)
+    titles, ingredients, group = [], [], []
+    dish = 0
+    while len(titles) < size:
+        base_title = (f"{rng.choice(FLAVORS)} {rng.choice(STYLES)} {rng.choice(PROTEINS)} {rng.choice(BASES)} "
+                      f"{rng.choice(DISHES)}")
+        base_ingredients = rng.sample(PANTRY, 8)
+        for _ in range(min(rng.randint(1, 2 * variants - 1), size - len(titles))):
+            title = base_title
+            if rng.random() < 0.6:
+                title = f"{rng.choice(ADJECTIVES)} {title}"
+            names = list(base_ingredients)
+            for _ in range(rng.randint(0, 2)):
+                names[rng.randrange(len(names))] = rng.choice(PANTRY)
+            titles.append(title.title())
+            ingredients.append(names)
+            group.append(dish)
+        dish += 1
+    return titles, ingredients, np.array(group)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        titles, ingredients, group = synthetic_pool(size)
+        tokens = [recipe_tokens(title, names) for title, names in zip(titles, ingredients)]
+        index, build_seconds = timed(lambda: SimilarityIndex(tokens, args.threshold))
+
+        sample = random.Random(2).sample(range(size), min(args.queries, size))
+        times = []
+        for i in sample:
+            started = time.perf_counter()
+            index.similar(i)
+            times.append(time.perf_counter() - started)
+        times.sort()
+
+        families, family_seconds = timed(index.families)
+        print(f"{size} recipes ({group.max() + 1} dishes): build {build_seconds * 1000:.0f} ms, "
+              f"lookup mean {1e6 * sum(times) / len(times):.0f} us / p99 {1e6 * times[int(len(times) * 0.99)]:.0f} us, "
+              f"families {family_seconds * 1000:.0f} ms ({len(set(families.tolist()))} families)")
+
+    # Exact pairwise comparison on the smallest pool, for cost and accuracy
+    size = min(args.sizes)
+    titles, ingredients, _ = synthetic_pool(size)
+    tokens = [recipe_tokens(title, names) for title, names in zip(titles, ingredients)]
+    index = SimilarityIndex(tokens, args.threshold)
+    sample = random.Random(3).sample(range(size), min(200, size))
+
+    def exact(i):
+        return {j for j in range(size) if j != i and jaccard(tokens[i], tokens[j]) >= args.threshold}
+
+    truth, exact_seconds = timed(lambda: [exact(i) for i in sample])
+    found = [set(index.similar(i).tolist()) for i in sample]
+    true_positives = sum(len(t & f) for t, f in zip(truth, found))
+    recall = true_positives / max(1, sum(len(t) for t in truth))
+    precision = true_positives / max(1, sum(len(f) for f in found))
+    per_query = exact_seconds / len(sample)
+    print(f"exact Jaccard over {size} recipes: {per_query * 1000:.1f} ms per lookup, "
+          f"~{per_query * size / 2:.0f} s for every pair; index recall {recall:.1%}, precision {precision:.1%}")
+
+    # A real plan: three fetched pools of 100 recipes each
+    titles, ingredients, _ = synthetic_pool(300, seed=4)
+    stores = {
+        meal: RecipeStore(
+            range(first, first + 100), titles[first:first + 100], [None] * 100,
+            np.column_stack([np.full(100, 500.0), np.full(100, 30.0)]), ingredients[first:first + 100],
+        )
+        for meal, first in (("breakfast", 0), ("lunch", 100), ("dinner", 200))
+    }
+    runs = 50
+
+    def cold():
+        similarity._family_cache.clear()
+        return DietCraft.planner_pools(stores)
+
+    _, cold_seconds = timed(lambda: [cold() for _ in range(runs)])
+    _, warm_seconds = timed(lambda: [DietCraft.planner_pools(stores) for _ in range(runs)])
+    print(f"planner_pools for 3 x 100 recipes: {cold_seconds / runs * 1000:.2f} ms, "
+          f"{warm_seconds / runs * 1000:.3f} ms for the next plan from the same pools")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup budget check for DietCraft.
+
+Imports `app` and calls create_app() in fresh interpreters against a throwaway database and
+reports the fastest of `--runs` attempts. Exits with status 1 if that time is over `--budget`
+seconds, or if startup pulled in a module that should only load on demand (pandas, bs4).
+Run it before and after touching imports to catch startup regressions.
+
+Usage:
+    python benchmarks/check_import_time.py [--budget 1.5] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy libraries that only specific routes need
+LAZY_MODULES = ("pandas", "bs4")
+
+PROBE = """
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+finished = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": finished - imported,
+    "total": finished - started,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def measure(env):
+    output = subprocess.check_output(
+        [sys.executable, "-c", PROBE % (LAZY_MODULES,)], cwd=ROOT, env=env, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET", 1.5)),
+                        help="Maximum seconds for import + create_app()")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            RECIPE_CACHE_PATH=os.path.join(tmp, "recipe_cache.db"),
+            RECIPE_BACKEND="spoonacular",
+        )
+        runs = [measure(env) for _ in range(args.runs)]
+
+    best = min(runs, key=lambda run: run["total"])
+    print(f"import app   {1000 * best['import']:8.1f} ms")
+    print(f"create_app() {1000 * best['create_app']:8.1f} ms")
+    print(f"total        {1000 * best['total']:8.1f} ms  (budget {1000 * args.budget:.0f} ms, best of {args.runs})")
+
+    failed = False
+    if best["total"] > args.budget:
+        print(f"FAIL: startup took {best['total']:.3f}s, over the {args.budget:.3f}s budget")
+        failed = True
+    if best["loaded"]:
+        print(f"FAIL: startup imported {', '.join(best['loaded'])}; these should load on first use")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
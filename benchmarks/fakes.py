@@ -0,0 +1,115 @@
+"""
+Local stand-ins for the third-party services DietCraft calls.
+
+FakeUpstream serves recorded fixtures from benchmarks/fixtures over HTTP:
+  /recipes/complexSearch      recorded complexSearch results, picked by the first `type`
+  /recipes/informationBulk    recorded recipe information for the requested `ids`
+  /calorie-calculator.html    recorded calculator.net result page
+with a configurable response latency (plus jitter) and error rate.
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES, "complex_search.json")) as f:
+        complex_search = json.load(f)
+    with open(os.path.join(FIXTURES, "information_bulk.json")) as f:
+        information = {int(k): v for k, v in json.load(f).items()}
+    with open(os.path.join(FIXTURES, "calculator.html"), "rb") as f:
+        calculator = f.read()
+    return complex_search, information, calculator
+
+
+class FakeUpstream:
+    """Threaded HTTP server on localhost. Use as a context manager or call start()/stop()."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._complex_search, self._information, self._calculator = load_fixtures()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay_and_fail(self):
+        """Sleeps for the configured latency; returns True if this request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        time.sleep(delay)
+        return fail
+
+    def _respond(self, path, query):
+        if path == "/recipes/complexSearch":
+            kind = query.get("type", ["main course"])[0].split(",")[0]
+            body = self._complex_search.get(kind, self._complex_search["main course"])
+            return "application/json", json.dumps(body).encode()
+        if path == "/recipes/informationBulk":
+            ids = [int(i) for i in query.get("ids", [""])[0].split(",") if i]
+            body = [self._information[i] for i in ids if i in self._information]
+            return "application/json", json.dumps(body).encode()
+        if path == "/calorie-calculator.html":
+            return "text/html; charset=utf-8", self._calculator
+        return None
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                response = upstream._respond(url.path, parse_qs(url.query))
+                if response is None:
+                    status, content_type, body = 404, "text/plain", b"not found"
+                elif upstream._delay_and_fail():
+                    status, content_type, body = 503, "text/plain", b"injected failure"
+                else:
+                    status, (content_type, body) = 200, response
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
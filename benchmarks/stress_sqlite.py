@@ -0,0 +1,175 @@
+"""
+Concurrency stress test for the SQLite storage profiles (see modules/storage.py).
+
+For each profile, builds a throwaway database through create_app() with `--users` users and their
+weekly plans. It then starts `--writers` processes regenerating plans in chunks of `--batch` users
+(replace_meal_plans, as `flask regenerate-plans` does), alongside `--readers` processes loading
+random users' profiles (the user row plus plan_entries). Separate processes stand in for
+gunicorn workers. The script reports throughput, latency and errors such as "database is locked"
+for both sides.
+
+With the "default" profile (rollback journal) a large write transaction soon needs an exclusive
+lock, and profile reads stall until it commits. With "production" (WAL) they keep going.
+
+Usage:
+    python benchmarks/stress_sqlite.py [--profile default production] [--users 5000] [--writers 1]
+                                       [--readers 3] [--batch 500] [--seconds 10]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MEALS = ("snack", "breakfast", "lunch", "dinner")
+
+
+def weekly_meals(recipes=2000):
+    week = {}
+    for day in range(1, 8):
+        week[f"Day {day}"] = {"snack": {"id": None, "title": "Custom Snack", "calories": 200, "protein": 10, "url": None}}
+        for meal in MEALS[1:]:
+            recipe_id = random.randrange(1, recipes)
+            week[f"Day {day}"][meal] = {
+                "id": recipe_id,
+                "title": f"Recipe {recipe_id}",
+                "calories": 300 + recipe_id % 500,
+                "protein": 5 + recipe_id % 50,
+                "url": f"https://example.com/recipes/{recipe_id}",
+            }
+    return week
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+
+def load_app():
+    warnings.filterwarnings("ignore")
+    import app as dietcraft_app
+
+    return dietcraft_app, dietcraft_app.create_app()
+
+
+def seed(users):
+    from modules.plans import meal_plan_rows, replace_meal_plans
+    from modules.storage import pragma_values
+
+    dietcraft_app, flask_app = load_app()
+    db, User = dietcraft_app.db, dietcraft_app.User
+    with flask_app.app_context():
+        db.session.add_all(
+            User(id=i, email=f"user{i}@example.com", password="x", name=f"user{i}") for i in range(1, users + 1)
+        )
+        db.session.commit()
+        for first in range(1, users + 1, 500):
+            user_ids = range(first, min(first + 500, users + 1))
+            rows = [row for user_id in user_ids for row in meal_plan_rows(user_id, weekly_meals())]
+            replace_meal_plans(db.session, dietcraft_app.MealPlan, user_ids, rows, User=User, Recipe=dietcraft_app.Recipe)
+        with db.engine.connect() as conn:
+            pragmas = pragma_values(conn)
+        db.engine.dispose()
+    return pragmas
+
+
+def worker(role, args, start_at, results):
+    """One writer or reader process, like a gunicorn worker; runs until `args.seconds` after `start_at`."""
+    from modules.plans import meal_plan_rows, plan_entries, replace_meal_plans
+
+    dietcraft_app, flask_app = load_app()
+    db, User, MealPlan, Recipe = dietcraft_app.db, dietcraft_app.User, dietcraft_app.MealPlan, dietcraft_app.Recipe
+    stats = {"role": role, "ops": 0, "users_written": 0, "short_reads": 0, "times": [], "errors": Counter()}
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + args.seconds
+    with flask_app.app_context():
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                if role == "writer":
+                    user_ids = random.sample(range(1, args.users + 1), args.batch)
+                    rows = [row for user_id in user_ids for row in meal_plan_rows(user_id, weekly_meals())]
+                    replace_meal_plans(db.session, MealPlan, user_ids, rows, User=User, Recipe=Recipe)
+                    stats["users_written"] += len(user_ids)
+                else:
+                    user_id = random.randint(1, args.users)
+                    db.session.get(User, user_id)
+                    # A plan read half-written would mean a writer's transaction leaked
+                    stats["short_reads"] += len(plan_entries(db.session, MealPlan, Recipe, user_id)) != 28
+                    db.session.rollback()  # End the read transaction, as the end of a request would
+            except Exception as e:
+                db.session.rollback()
+                stats["errors"][str(e).splitlines()[0][:80]] += 1
+                continue
+            stats["times"].append(time.perf_counter() - started)
+            stats["ops"] += 1
+    results.put(stats)
+
+
+def run_profile(profile, args, tmp):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, f'stress-{profile}.db')}"
+    os.environ["DB_PROFILE"] = profile
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        pragmas = pool.apply(seed, (args.users,))
+
+    results = context.Queue()
+    start_at = time.time() + 3  # Time for every process to import the app
+    processes = [context.Process(target=worker, args=("writer", args, start_at, results)) for _ in range(args.writers)]
+    processes += [context.Process(target=worker, args=("reader", args, start_at, results)) for _ in range(args.readers)]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    def merged(role):
+        role_stats = [s for s in stats if s["role"] == role]
+        times = sorted(t for s in role_stats for t in s["times"])
+        errors = sum((s["errors"] for s in role_stats), Counter())
+        return role_stats, times, errors
+
+    print(f"\n== {profile} profile: {pragmas}")
+    for role in ("writer", "reader"):
+        role_stats, times, errors = merged(role)
+        ops = sum(s["ops"] for s in role_stats)
+        line = (f"{role}s: {ops / args.seconds:.1f} ops/s, p50 {1000 * (percentile(times, 50) or 0):.1f} ms, "
+                f"p99 {1000 * (percentile(times, 99) or 0):.1f} ms, max {1000 * (times[-1] if times else 0):.1f} ms, "
+                f"errors {sum(errors.values())}")
+        if role == "writer":
+            line += f" ({sum(s['users_written'] for s in role_stats) / args.seconds:.0f} users/s)"
+        else:
+            line += f", incomplete plans read {sum(s['short_reads'] for s in role_stats)}"
+        print(line)
+        for message, count in errors.most_common():
+            print(f"  {count:5d}  {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", nargs="+", default=["default", "production"])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--writers", type=int, default=1, help="Writer processes")
+    parser.add_argument("--readers", type=int, default=3, help="Reader processes")
+    parser.add_argument("--batch", type=int, default=500, help="Users per regenerate transaction (regenerate-plans --chunk-size)")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Inherited by the spawned processes, which read their configuration when importing the app
+        os.environ["RECIPE_CACHE_PATH"] = os.path.join(tmp, "recipe_cache.db")
+        for profile in args.profile:
+            run_profile(profile, args, tmp)
+
+
+if __name__ == "__main__":
+    main()
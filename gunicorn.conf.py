@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+# Run with: gunicorn -c gunicorn.conf.py
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+# Threads per worker; each needs a pooled DB connection, so keep under DB_POOL_SIZE + DB_MAX_OVERFLOW
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Build the app (schema creation included) once in the master; workers fork from it
+preload_app = True
+
+# Every worker counts its own metrics; with more than one, they share them through METRICS_DIR so
+# /metrics reports the whole server whichever worker answers (see modules/metrics.py).
+# Set before the app is loaded, which reads it at import time.
+if workers > 1:
+    os.environ.setdefault("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics"))
+
+
+def on_starting(server):
+    # The preloaded app already exists here; warm it up before any worker forks
+    from app import warm_up
+    from modules import metrics
+
+    metrics.clear_dir()
+    warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    from modules import metrics
+
+    metrics.worker_started()
+
+
+def worker_exit(server, worker):
+    # Last counts of a worker that is shutting down or being replaced
+    from modules import metrics
+
+    metrics.flush()
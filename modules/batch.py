@@ -0,0 +1,133 @@
+# modules/batch.py
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from requests import RequestException
+from sqlalchemy import select
+
+from modules.corpus import RecipeCorpus
+from modules.dietcraft import DietCraft
+from modules.plans import meal_plan_rows, replace_meal_plans
+from modules.recipe_cache import RecipeCache
+
+# Users whose targets fall in the same bucket share one set of recipe pools
+CALORIE_BUCKET = 50
+PROTEIN_BUCKET = 5
+
+
+def target_group(goal, daily_calories, daily_protein):
+    """Bucket key used to group users with similar targets."""
+    return goal, round(daily_calories / CALORIE_BUCKET), round(daily_protein / PROTEIN_BUCKET)
+
+
+def generate_group(api_key, cache_path, goal, users, corpus_path=None):
+    """
+    Worker: fetches the recipe pools once for a group of users, then assembles each user's week.
+
+    :param users: List of (user_id, daily_calories, daily_protein)
+    :param corpus_path: Local RecipeCorpus to search instead of the Spoonacular API
+    :return: List of (user_id, MealPlan rows)
+    """
+    cache = RecipeCache(cache_path) if cache_path else None
+    search = RecipeCorpus(corpus_path).complex_search if corpus_path else None
+    group_calories = sum(u[1] for u in users) / len(users)
+    group_protein = sum(u[2] for u in users) / len(users)
+
+    pools = DietCraft.fetch_meal_pools(api_key, group_calories, group_protein, goal, cache=cache, search=search)
+    return [
+        (user_id, meal_plan_rows(user_id, DietCraft.assemble_weekly_meals(pools, calories, protein)))
+        for user_id, calories, protein in users
+    ]
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get("last_user_id", 0)
+    return 0
+
+
+def _save_checkpoint(path, last_user_id):
+    if path:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"last_user_id": last_user_id}, f)
+        os.replace(tmp_path, path)
+
+
+def regenerate_all_plans(db, User, MealPlan, api_key, cache_path=None, checkpoint_path=None,
+                         workers=None, chunk_size=500, corpus_path=None, log=print, Recipe=None, PlanArchive=None):
+    """
+    Regenerates the weekly plan of every user with stored requirements.
+
+    Users are read from the database in id order, `chunk_size` at a time. Each chunk is split
+    into groups of similar targets and the groups run on a process pool. Plans are written back in
+    one bulk transaction per chunk, after which the last user id is saved to `checkpoint_path`,
+    so an interrupted run picks up after the last finished chunk.
+
+    :return: Dictionary with users processed, elapsed seconds and users per second
+    """
+    last_user_id = _load_checkpoint(checkpoint_path)
+    if last_user_id:
+        log(f"Resuming after user {last_user_id}")
+
+    def next_chunk(after_id):
+        # Keyset pagination, so no cursor stays open while we write
+        return db.session.execute(
+            select(User.id, User.calorie_requirement, User.protein_requirement, User.goal)
+            .where(
+                User.id > after_id,
+                User.calorie_requirement.is_not(None),
+                User.protein_requirement.is_not(None),
+                User.goal.is_not(None),
+            )
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).all()
+
+    processed = 0
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        while chunk := next_chunk(last_user_id):
+            groups = defaultdict(list)
+            for user_id, calories, protein, goal in chunk:
+                groups[target_group(goal, float(calories), float(protein))].append(
+                    (user_id, float(calories), float(protein))
+                )
+
+            futures = {
+                executor.submit(generate_group, api_key, cache_path, key[0], users, corpus_path): users
+                for key, users in groups.items()
+            }
+            results = []
+            for future in as_completed(futures):
+                try:
+                    results.extend(future.result())
+                except RequestException as e:
+                    # No pools for this group (not even stale ones): keep these users' current plans
+                    log(f"Skipped {len(futures[future])} users: {e}")
+
+            replace_meal_plans(
+                db.session, MealPlan,
+                [user_id for user_id, _ in results],
+                [row for _, rows in results for row in rows],
+                User=User,
+                Recipe=Recipe,
+                PlanArchive=PlanArchive,
+            )
+
+            processed += len(chunk)
+            last_user_id = chunk[-1][0]
+            _save_checkpoint(checkpoint_path, last_user_id)
+            elapsed = time.perf_counter() - started
+            log(f"{processed} users, {len(groups)} groups in last chunk, {processed / elapsed:.1f} users/s")
+
+    elapsed = time.perf_counter() - started
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)  # Finished, next run starts from the beginning
+    return {"users": processed, "seconds": elapsed, "users_per_second": processed / elapsed if elapsed else 0.0}
@@ -0,0 +1,115 @@
+# modules/calories.py
+import numpy as np
+
+# Activity multipliers used by the calculator.net calorie calculator (cactivity)
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.465,
+    "active": 1.55,
+}
+
+# Unit conversions used by calculator.net
+LBS_PER_KG = 2.2046226218
+CM_PER_INCH = 2.54
+
+# Daily calorie offsets from maintenance for each lbs_per_week band.
+# 1 lb of body weight ~ 3500 kcal, so 0.5 / 1 / 2 lb per week is 250 / 500 / 1000 kcal per day.
+# Index 0 is the 0.2-0.8 band, 1 is 0.8-1.8 and 2 is 1.8-2.5 (same bands as the old scrape).
+LOSS_OFFSETS = np.array([-250, -500, -1000])
+GAIN_OFFSETS = np.array([250, 500, 1000])
+
+
+def activity_factor(activity):
+    """Returns the numeric multiplier for an activity level name (or passes a positive number through)."""
+    if isinstance(activity, str):
+        try:
+            return ACTIVITY_FACTORS[activity]
+        except KeyError:
+            raise ValueError(f"Unknown activity level: {activity}")
+    try:
+        factor = float(activity)
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown activity level: {activity}")
+    if not factor > 0:
+        raise ValueError(f"Unknown activity level: {activity}")
+    return factor
+
+
+def is_male(gender):
+    """
+    True for 'male', False for 'female' (only the first letter is used, in any case). Works on a
+    single value or an array of them; raises ValueError for anything else, including None.
+    """
+    genders = np.asarray(gender, dtype=object)
+    first = np.array([g[:1].lower() if isinstance(g, str) else "" for g in genders.ravel()]).reshape(genders.shape)
+    unknown = ~np.isin(first, ["m", "f"])
+    if unknown.any():
+        raise ValueError(f"Unknown gender: {genders[unknown].ravel()[0]!r}")
+    return first == "m"
+
+
+def bmr(age, gender, height_feet, height_inch, weight):
+    """
+    Mifflin-St Jeor basal metabolic rate. Works on scalars or NumPy arrays.
+
+    :param age: Age in years
+    :param gender: 'male' / 'female' (see is_male), or an array of them
+    :param height_feet: Height, feet part
+    :param height_inch: Height, inches part
+    :param weight: Weight in lbs
+    :return: BMR in kcal/day
+    """
+    weight_kg = np.asarray(weight, dtype=float) / LBS_PER_KG
+    height_cm = (np.asarray(height_feet, dtype=float) * 12 + np.asarray(height_inch, dtype=float)) * CM_PER_INCH
+    return 10 * weight_kg + 6.25 * height_cm - 5 * np.asarray(age, dtype=float) + np.where(is_male(gender), 5, -161)
+
+
+def maintenance_calories(age, gender, height_feet, height_inch, weight, activity):
+    """Calories/day to maintain the current weight, rounded like calculator.net."""
+    return np.floor(bmr(age, gender, height_feet, height_inch, weight) * activity + 0.5)
+
+
+def batch_calorie_requirements(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity):
+    """
+    Computes calorie requirements for many user profiles in one vectorized pass.
+
+    Every argument is an array (or list) with one entry per user; activity may hold level names
+    or numeric multipliers. Users whose weekly change is outside the supported bands
+    (0.2 < lbs_per_week < 2.5), or who have no weight change at all, get NaN. A gender or activity
+    level the formula can't place (None included) raises ValueError.
+
+    :return: float64 NumPy array of calories/day
+    """
+    activity = np.array([activity_factor(a) for a in np.atleast_1d(activity)], dtype=float)
+    weight = np.atleast_1d(np.asarray(weight, dtype=float))
+    desired_weight = np.atleast_1d(np.asarray(desired_weight, dtype=float))
+    time_frame = np.atleast_1d(np.asarray(time_frame, dtype=float))
+
+    maintenance = maintenance_calories(age, gender, height_feet, height_inch, weight, activity)
+
+    change = desired_weight - weight
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lbs_per_week = np.where(time_frame > 0, np.abs(change) / time_frame, np.inf)
+
+    band = np.select(
+        [
+            (0.2 < lbs_per_week) & (lbs_per_week <= 0.8),
+            (0.8 < lbs_per_week) & (lbs_per_week <= 1.8),
+            (1.8 < lbs_per_week) & (lbs_per_week < 2.5),
+        ],
+        [0, 1, 2],
+        default=-1,
+    )
+    valid = (band >= 0) & (change != 0)
+    offsets = np.where(change < 0, LOSS_OFFSETS[band.clip(0)], GAIN_OFFSETS[band.clip(0)])
+
+    return np.where(valid, maintenance + offsets, np.nan)
+
+
+def calorie_requirement(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity):
+    """Single-user wrapper around batch_calorie_requirements. Returns an int, or None if not suggested."""
+    result = batch_calorie_requirements(
+        [age], [gender], [height_feet], [height_inch], [weight], [desired_weight], [time_frame], [activity]
+    )[0]
+    return None if np.isnan(result) else int(result)
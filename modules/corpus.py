@@ -0,0 +1,236 @@
+# modules/corpus.py
+import json
+import sqlite3
+import threading
+from itertools import zip_longest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_recipes_calories ON recipes (calories);
+CREATE INDEX IF NOT EXISTS ix_recipes_protein ON recipes (protein);
+
+-- One row per (dish type, recipe) with the macros copied in, so a type + calorie range
+-- query is a single covering index range scan
+CREATE TABLE IF NOT EXISTS recipe_dish_types (
+    dish_type TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id),
+    PRIMARY KEY (dish_type, calories, protein, recipe_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_recipe_dish_types_recipe ON recipe_dish_types (recipe_id);
+
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id),
+    name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    unit TEXT NOT NULL,
+    aisle TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_recipe_ingredients_recipe ON recipe_ingredients (recipe_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5 (title, content='recipes', content_rowid='id');
+"""
+
+
+def _spread(column):
+    """
+    SQL ordering key for a fixed pseudo-random order (a multiplicative hash of the id). A LIMIT in
+    this order samples the whole calorie window rather than its low end, which is the index order,
+    and gives the same sample every time for the same query.
+    """
+    return f"({column} * 2654435761) % 4294967296"
+
+
+def _nutrient(recipe, name):
+    nutrients = recipe.get("nutrition", {}).get("nutrients", [])
+    return next((n["amount"] for n in nutrients if n["name"] == name), 0)
+
+
+class RecipeCorpus:
+    """
+    Local, offline recipe store in SQLite.
+
+    Loaded from a JSONL dump of Spoonacular recipe objects (id, title, dishTypes, nutrition and
+    optionally extendedIngredients).
+    complex_search answers the same query shape fetch_recipes sends to Spoonacular's
+    complexSearch (minCalories/maxCalories/minProtein/type/number) and returns results in the
+    same format, so it can be used as a drop-in search backend for DietCraft. Its results are a
+    fixed sample of the whole calorie window, with the requested dish types interleaved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # One connection per thread; the queries are read-only and SQLite handles concurrent readers
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def close(self):
+        """
+        Closes this thread's connection and forgets every thread's, so each thread reconnects on
+        its next query. Call before forking: a SQLite connection must not be shared across a fork.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local = threading.local()
+
+    def load_jsonl(self, path, batch_size=5000):
+        """Loads (or replaces) recipes from a JSONL dump. Returns the number of recipes read."""
+        conn = self._connection()
+        count = 0
+
+        def flush(recipes, dish_types, ingredients):
+            conn.executemany(
+                "INSERT OR REPLACE INTO recipes (id, title, calories, protein) VALUES (?, ?, ?, ?)", recipes
+            )
+            recipe_ids = [(r[0],) for r in recipes]
+            conn.executemany("DELETE FROM recipe_dish_types WHERE recipe_id = ?", recipe_ids)
+            conn.executemany("DELETE FROM recipe_ingredients WHERE recipe_id = ?", recipe_ids)
+            conn.executemany(
+                "INSERT OR IGNORE INTO recipe_dish_types (dish_type, calories, protein, recipe_id) VALUES (?, ?, ?, ?)",
+                dish_types,
+            )
+            conn.executemany(
+                "INSERT INTO recipe_ingredients (recipe_id, name, amount, unit, aisle) VALUES (?, ?, ?, ?, ?)",
+                ingredients,
+            )
+
+        with conn:
+            recipes, dish_types, ingredients = [], [], []
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    recipe = json.loads(line)
+                    calories = _nutrient(recipe, "Calories")
+                    protein = _nutrient(recipe, "Protein")
+                    recipes.append((recipe["id"], recipe["title"], calories, protein))
+                    for dish_type in recipe.get("dishTypes", []):
+                        dish_types.append((dish_type.lower(), calories, protein, recipe["id"]))
+                    for ingredient in recipe.get("extendedIngredients", []):
+                        ingredients.append((
+                            recipe["id"],
+                            ingredient.get("nameClean") or ingredient["name"],
+                            ingredient.get("amount", 0),
+                            ingredient.get("unit", ""),
+                            ingredient.get("aisle"),
+                        ))
+                    count += 1
+                    if len(recipes) >= batch_size:
+                        flush(recipes, dish_types, ingredients)
+                        recipes, dish_types, ingredients = [], [], []
+            if recipes:
+                flush(recipes, dish_types, ingredients)
+            conn.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+        conn.execute("ANALYZE")
+        return count
+
+    def complex_search(self, params):
+        """Answers a complexSearch-style query. Returns a list of results in the API's format."""
+        types = [t.strip().lower() for t in str(params.get("type", "")).split(",") if t.strip()]
+        min_calories = float(params.get("minCalories", 0))
+        max_calories = float(params.get("maxCalories", float("inf")))
+        min_protein = float(params.get("minProtein", 0))
+        number = int(params.get("number", 10))
+
+        conn = self._connection()
+        if types:
+            # Up to `number` matches per type, interleaved, so every type gets its share of the result
+            per_type = [
+                [row[0] for row in conn.execute(
+                    f"""
+                    SELECT recipe_id FROM recipe_dish_types
+                    WHERE dish_type = ? AND calories BETWEEN ? AND ? AND protein >= ?
+                    ORDER BY {_spread("recipe_id")}
+                    LIMIT ?
+                    """,
+                    (dish_type, min_calories, max_calories, min_protein, number),
+                )]
+                for dish_type in types
+            ]
+            interleaved = (recipe_id for batch in zip_longest(*per_type) for recipe_id in batch if recipe_id is not None)
+            ids = list(dict.fromkeys(interleaved))[:number]  # A recipe can have several of the types
+            found = {
+                row[0]: row
+                for row in conn.execute(
+                    f"SELECT id, title, calories, protein FROM recipes WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+            }
+            rows = [found[recipe_id] for recipe_id in ids]
+        else:
+            rows = conn.execute(
+                f"""
+                SELECT id, title, calories, protein FROM recipes
+                WHERE calories BETWEEN ? AND ? AND protein >= ?
+                ORDER BY {_spread("id")}
+                LIMIT ?
+                """,
+                (min_calories, max_calories, min_protein, number),
+            ).fetchall()
+
+        # Ingredient names, as addRecipeNutrition returns them under nutrition.ingredients
+        ingredients = {}
+        if rows:
+            ids = [row[0] for row in rows]
+            for recipe_id, name in conn.execute(
+                f"SELECT recipe_id, name FROM recipe_ingredients WHERE recipe_id IN ({','.join('?' * len(ids))})", ids
+            ):
+                ingredients.setdefault(recipe_id, []).append({"name": name})
+
+        return [
+            {
+                "id": recipe_id,
+                "title": title,
+                "nutrition": {
+                    "nutrients": [
+                        {"name": "Calories", "amount": calories, "unit": "kcal"},
+                        {"name": "Protein", "amount": protein, "unit": "g"},
+                    ],
+                    "ingredients": ingredients.get(recipe_id, []),
+                },
+            }
+            for recipe_id, title, calories, protein in rows
+        ]
+
+    def information_bulk(self, ids):
+        """Local counterpart of Spoonacular's informationBulk: recipes with their extendedIngredients."""
+        if not ids:
+            return []
+        ids = list(ids)
+        placeholders = ",".join("?" * len(ids))
+        conn = self._connection()
+        recipes = {
+            recipe_id: {"id": recipe_id, "title": title, "extendedIngredients": []}
+            for recipe_id, title in conn.execute(f"SELECT id, title FROM recipes WHERE id IN ({placeholders})", ids)
+        }
+        for recipe_id, name, amount, unit, aisle in conn.execute(
+            f"SELECT recipe_id, name, amount, unit, aisle FROM recipe_ingredients WHERE recipe_id IN ({placeholders})",
+            ids,
+        ):
+            recipes[recipe_id]["extendedIngredients"].append(
+                {"name": name, "amount": amount, "unit": unit, "aisle": aisle}
+            )
+        return list(recipes.values())
+
+    def search_titles(self, query, limit=20):
+        """Full-text title search. Returns (id, title) pairs ordered by relevance."""
+        return self._connection().execute(
+            "SELECT rowid, title FROM recipes_fts WHERE recipes_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit),
+        ).fetchall()
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
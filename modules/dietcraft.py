@@ -1,16 +1,29 @@
 # modules/dietcraft.py
-import pandas as pd
-from collections import defaultdict
+import os
 from io import StringIO
 import csv
 import requests
-from bs4 import BeautifulSoup
+from modules import metrics, profiling, shopping, similarity, spoonacular
+from modules.calories import calorie_requirement, batch_calorie_requirements
+from modules.planner import iter_plan, plan_day, plan_week
+from modules.recipes import RecipeStore
+from modules.upstream import UpstreamClient
+
+CALCULATOR_URL = os.getenv("CALCULATOR_URL", "https://www.calculator.net/calorie-calculator.html")
+
+# Shared client for the calculator.net scrape (coalescing, retries, circuit breaker)
+calculator_client = UpstreamClient("calculator.net")
 
 class DietCraft:
     def __init__(self):
         pass
 
-    def generate_weekly_meals(api_key, daily_calories, daily_protein, goal="maintain", custom_snack=None):
+    # Default snack used when the user has no custom meal
+    DEFAULT_SNACK = {"title": "Protein Shake (Custom)", "calories": 290, "protein": 33, "url": None}
+
+    @profiling.profiled("DietCraft.generate_weekly_meals")
+    def generate_weekly_meals(api_key, daily_calories, daily_protein, goal="maintain", custom_snack=None, cache=None,
+                              search=None):
         """
         Generates weekly meals based on calorie and protein requirements.
         Replaces the snack with a custom meal for every day.
@@ -21,10 +34,23 @@ class DietCraft:
         :param goal: Weight goal - 'gain', 'lose', or 'maintain'
         :param custom_snack: Dictionary specifying custom meal details to replace snack.
                             Example: {"title": "Fruit Smoothie", "calories": 150, "protein": 5, "url": None}
+        :param cache: Optional RecipeCache used to reuse recipe pools across users with nearby targets
+        :param search: Recipe search backend taking complexSearch params, e.g. RecipeCorpus.complex_search.
+                       Defaults to the live Spoonacular API.
         :return: Dictionary containing the weekly meal plan
         """
+        pools = DietCraft.fetch_meal_pools(api_key, daily_calories, daily_protein, goal, custom_snack, cache, search)
+        with metrics.stage("plan_assembly"):
+            return DietCraft.assemble_weekly_meals(pools, daily_calories, daily_protein, custom_snack)
+
+    def meal_requirements(daily_calories, daily_protein, custom_snack=None):
+        """
+        Splits the daily targets left after the snack into per-meal calorie/protein targets.
+
+        :return: Dictionary of {meal: {"calories", "protein", "type"}}
+        """
         # Default custom snack if none is provided
-        custom_snack = custom_snack or {"title": "Protein Shake (Custom)", "calories": 290, "protein": 33, "url": None}
+        custom_snack = custom_snack or DietCraft.DEFAULT_SNACK
         snack_calories = custom_snack.get("calories", 0)
         snack_protein = custom_snack.get("protein", 0)
 
@@ -47,7 +73,7 @@ class DietCraft:
         }
 
         # Calculate calories and protein for each meal
-        meal_requirements = {
+        return {
             meal: {
                 "calories": int(remaining_calories * fraction),
                 "protein": int(remaining_protein * fraction),
@@ -56,6 +82,20 @@ class DietCraft:
             for meal, fraction in meal_distribution.items()
         }
 
+    def fetch_meal_pools(api_key, daily_calories, daily_protein, goal="maintain", custom_snack=None, cache=None,
+                         search=None, meals=None):
+        """
+        Fetches one recipe pool per meal type (concurrently, through the cache if given).
+        If a fetch fails, the expired cached pool is used when there is one; otherwise the
+        RequestException propagates rather than producing a plan of empty slots.
+
+        :param search: Recipe search backend taking complexSearch params (default: Spoonacular)
+        :param meals: Only fetch the pools for these meals (default: all of them)
+        :return: Dictionary of {meal: RecipeStore}
+        """
+        search = search or spoonacular.complex_search
+        meal_requirements = DietCraft.meal_requirements(daily_calories, daily_protein, custom_snack)
+
         # Adjust calorie range based on the goal
         def adjust_calorie_range(calories, goal):
             if goal == "Gain":
@@ -66,81 +106,247 @@ class DietCraft:
 
         # Fetch a batch of recipes for each meal type
         def fetch_recipes(meal, min_calories, max_calories, protein, types):
-            url = "https://api.spoonacular.com/recipes/complexSearch"
+            min_protein = protein - 5  # Slightly relaxed protein requirement
+
+            # Snap the query to cache buckets so nearby targets share one cached pool
+            if cache is not None:
+                min_calories, max_calories, min_protein = cache.quantize(min_calories, max_calories, min_protein)
+                cache_key = cache.key(meal, types, min_calories, max_calories, min_protein)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return RecipeStore.from_rows(cached)
+
             params = {
                 "number": 100,  # Fetch a large batch for reuse
                 "minCalories": min_calories,
                 "maxCalories": max_calories,
-                "minProtein": protein - 5,     # Slightly relaxed protein requirement
+                "minProtein": min_protein,
                 "type": ",".join(types),       # Specify the meal types
                 "addRecipeNutrition": True,    # Include nutrition details
                 "apiKey": api_key              # Include API key in parameters
             }
             try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("results", [])
+                results = search(params)
             except requests.exceptions.RequestException as e:
-                print(f"API connection error for {meal}: {e}")
-                return []
-
-        # Pre-fetch recipes for each meal type
-        all_recipes = {}
+                # Upstream down, out of quota or circuit open: an expired pool beats an empty plan.
+                # The miss was counted by the lookup above, so this one doesn't count again.
+                stale = cache.get(cache_key, allow_stale=True, count=False) if cache is not None else None
+                if stale is None:
+                    raise
+                print(f"API connection error for {meal}, serving a stale pool: {e}")
+                metrics.inc("dietcraft_stale_pools_total", meal=meal)
+                return RecipeStore.from_rows(stale)
+
+            # Keep only the columns we use; the raw payload is dropped here
+            with metrics.stage("recipe_parse"):
+                store = RecipeStore.from_api(results)
+            if cache is not None and len(store):
+                cache.set(cache_key, store.to_rows())
+            return store
+
+        # Pre-fetch recipes for each meal type, all meals at once
+        fetch_calls = {}
         for meal, req in meal_requirements.items():
+            if meals is not None and meal not in meals:
+                continue
             min_cal, max_cal = adjust_calorie_range(req["calories"], goal)
-            all_recipes[meal] = fetch_recipes(meal, min_cal, max_cal, req["protein"], req["type"])
+            fetch_calls[meal] = (meal, min_cal, max_cal, req["protein"], req["type"])
+        with metrics.stage("recipe_fetch"):
+            return spoonacular.fetch_all(fetch_recipes, fetch_calls)
+
+    def assemble_weekly_meals(all_recipes, daily_calories, daily_protein, custom_snack=None):
+        """
+        Builds the weekly plan from already fetched pools. Pools can be shared by users with
+        similar targets; each user's own targets drive the selection.
 
-        # Track recipe usage
-        recipe_usage = defaultdict(int)  # Key: recipe ID, Value: count
+        :param all_recipes: Dictionary of {meal: RecipeStore} from fetch_meal_pools
+        :return: Dictionary containing the weekly meal plan
+        """
+        custom_snack = custom_snack or DietCraft.DEFAULT_SNACK
+        meal_requirements = DietCraft.meal_requirements(daily_calories, daily_protein, custom_snack)
+
+        # Solve the whole week against the targets (max 4 uses per recipe, once per day)
+        slot_targets = {meal: (req["calories"], req["protein"]) for meal, req in meal_requirements.items()}
+        week = plan_week(
+            DietCraft.planner_pools(all_recipes),
+            slot_targets,
+            daily_calories=sum(c for c, _ in slot_targets.values()),
+            daily_protein=sum(p for _, p in slot_targets.values()),
+            days=7,
+            max_uses=4,
+        )
 
         # Generate a week's worth of meals
-        weekly_meals = {}
-        for day in range(1, 8):  # Loop through 7 days
-            daily_plan = {}
-
-            # Add custom snack for each day
-            daily_plan["snack"] = {
-                "title": custom_snack.get("title", "Custom Snack"),
-                "calories": snack_calories,
-                "protein": snack_protein,
-                "url": custom_snack.get("url", None)
+        return {
+            f"Day {day}": DietCraft.daily_plan(all_recipes, choice, custom_snack)
+            for day, choice in enumerate(week, start=1)
+        }
+
+    def stream_meal_plan(api_key, daily_calories, daily_protein, goal="maintain", days=None, window=7, max_uses=4,
+                         custom_snack=None, cache=None, search=None):
+        """
+        Generator version of generate_weekly_meals for long horizons: yields ("Day n", daily_plan)
+        one day at a time, so the first days can be stored or sent while later ones are solved.
+
+        Pools are fetched once, when the first day is requested. A recipe is used at most
+        `max_uses` times in any `window` consecutive days and at most once a day. Nothing is
+        kept per yielded day beyond that window, so memory stays flat for any horizon.
+
+        :param days: Number of days to plan, e.g. 7 * time_frame weeks; None for no end
+        :return: Generator of (day label, {meal: details}) pairs
+        """
+        custom_snack = custom_snack or DietCraft.DEFAULT_SNACK
+        all_recipes = DietCraft.fetch_meal_pools(api_key, daily_calories, daily_protein, goal, custom_snack, cache,
+                                                 search)
+        meal_requirements = DietCraft.meal_requirements(daily_calories, daily_protein, custom_snack)
+        slot_targets = {meal: (req["calories"], req["protein"]) for meal, req in meal_requirements.items()}
+        plan = iter_plan(
+            DietCraft.planner_pools(all_recipes),
+            slot_targets,
+            daily_calories=sum(c for c, _ in slot_targets.values()),
+            daily_protein=sum(p for _, p in slot_targets.values()),
+            days=days,
+            window=window,
+            max_uses=max_uses,
+        )
+        for day, choice in enumerate(plan, start=1):
+            yield f"Day {day}", DietCraft.daily_plan(all_recipes, choice, custom_snack)
+
+    def planner_pools(all_recipes):
+        """
+        Planner input for fetched pools. Near-duplicate recipes (similar title and ingredients)
+        are given one shared id, so the planner's repeat limits treat them as the same dish:
+        never twice on one day, and at most `max_uses` times in a window between them.
+        """
+        families = similarity.recipe_families(all_recipes)
+        return {meal: (families[meal], store.calories, store.protein) for meal, store in all_recipes.items()}
+
+    def daily_plan(all_recipes, choice, custom_snack):
+        """One day's {meal: details} from a planner choice, with the custom snack added."""
+        daily_plan = {}
+
+        # Add custom snack for each day
+        daily_plan["snack"] = {
+            "title": custom_snack.get("title", "Custom Snack"),
+            "calories": custom_snack.get("calories", 0),
+            "protein": custom_snack.get("protein", 0),
+            "url": custom_snack.get("url", None)
+        }
+
+        for meal, index in choice.items():
+            daily_plan[meal] = DietCraft.meal_details(all_recipes[meal], index)
+        return daily_plan
+
+    def meal_details(store, index):
+        """Plan entry for recipe `index` of a RecipeStore, or the placeholder when no recipe was picked."""
+        if index is None:
+            return {
+                "title": "No recipe found",
+                "calories": 0,
+                "protein": 0,
+                "url": None
             }
+        recipe = store[index]
+        return {
+            "id": recipe.id,
+            "title": recipe.title,
+            "calories": recipe.calories,
+            "protein": recipe.protein,
+            "url": recipe.url
+        }
 
-            used_recipes_today = set()  # Track recipes used for the current day
-            for meal, recipes in all_recipes.items():
-                recipe = next(
-                    (r for r in recipes if recipe_usage[r["id"]] < 4 and r["id"] not in used_recipes_today),
-                    None
-                )
-                if recipe:
-                    recipe_usage[recipe["id"]] += 1
-                    used_recipes_today.add(recipe["id"])
-                    
-                    # Parse nutritional information
-                    nutrients = recipe.get("nutrition", {}).get("nutrients", [])
-                    calories_value = next((n["amount"] for n in nutrients if n["name"] == "Calories"), 0)
-                    protein_value = next((n["amount"] for n in nutrients if n["name"] == "Protein"), 0)
-
-                    daily_plan[meal] = {
-                        "title": recipe["title"],
-                        "calories": calories_value,
-                        "protein": protein_value,
-                        "url": f'https://spoonacular.com/recipes/{recipe["title"].replace(" ", "-")}-{recipe["id"]}'
-                    }
-                else:
-                    daily_plan[meal] = {
-                        "title": "No recipe found",
-                        "calories": 0,
-                        "protein": 0,
-                        "url": None
-                    }
-            weekly_meals[f"Day {day}"] = daily_plan
-
-        return weekly_meals
+    def regenerate_meals(api_key, weekly_meals, day, daily_calories, daily_protein, goal="maintain", meal=None,
+                         custom_snack=None, cache=None, search=None, max_uses=4):
+        """
+        Re-picks the recipes of one day, or of a single meal slot, leaving the rest of the week as it is.
 
+        The replaced recipes are not picked again, the day's kept meals are not repeated (near-
+        duplicates included, as in planner_pools), and the per-recipe usage limit counts every
+        slot kept in the rest of the week. Pools come through
+        the same cache as generate_weekly_meals, so a swap usually needs no upstream call.
 
+        :param weekly_meals: The current plan, as returned by generate_weekly_meals
+        :param day: Day to regenerate, e.g. "Day 3"
+        :param meal: Only regenerate this meal slot ('breakfast', 'lunch' or 'dinner')
+        :return: Dictionary of {meal: details} for the regenerated slots only
+        """
+        meal_requirements = DietCraft.meal_requirements(daily_calories, daily_protein, custom_snack)
+        if day not in weekly_meals:
+            raise ValueError(f"Unknown day: {day}")
+        if meal is not None and meal not in meal_requirements:
+            raise ValueError(f"Unknown meal slot: {meal}")
+        slots = [meal] if meal is not None else list(meal_requirements)
+
+        # Usage over the rest of the week, and what stays on the day being changed
+        usage = {}
+        for other_day, daily_meals in weekly_meals.items():
+            for other_meal, details in daily_meals.items():
+                if details.get("id") is not None and not (other_day == day and other_meal in slots):
+                    usage[details["id"]] = usage.get(details["id"], 0) + 1
+        kept = {m: details for m, details in weekly_meals[day].items() if m in meal_requirements and m not in slots}
+        taken = {details["id"] for details in weekly_meals[day].values() if details.get("id") is not None}
+
+        pools = DietCraft.fetch_meal_pools(
+            api_key, daily_calories, daily_protein, goal, custom_snack, cache, search, meals=slots
+        )
+        planner_pools = DietCraft.planner_pools(pools)
+
+        # The planner counts near-duplicates by family; recipes not in these pools keep their own id
+        family_of = {
+            recipe_id: family
+            for m, store in pools.items()
+            for recipe_id, family in zip(store.ids.tolist(), planner_pools[m][0].tolist())
+        }
+        family_usage = {}
+        for recipe_id, uses in usage.items():
+            family = family_of.get(recipe_id, recipe_id)
+            family_usage[family] = family_usage.get(family, 0) + uses
+
+        slot_targets = {m: (meal_requirements[m]["calories"], meal_requirements[m]["protein"]) for m in slots}
+        choice = plan_day(
+            planner_pools,
+            slot_targets,
+            daily_calories=max(0, sum(r["calories"] for r in meal_requirements.values())
+                               - sum(details["calories"] for details in kept.values())),
+            daily_protein=max(0, sum(r["protein"] for r in meal_requirements.values())
+                              - sum(details["protein"] for details in kept.values())),
+            usage=family_usage,
+            taken={family_of.get(recipe_id, recipe_id) for recipe_id in taken},
+            max_uses=max_uses,
+        )
+        return {m: DietCraft.meal_details(pools[m], index) for m, index in choice.items()}
+
+
+    @profiling.profiled("DietCraft.generate_calorie_requirements")
     def generate_calorie_requirements(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity):
+        """
+        Calorie requirement computed in-process with the Mifflin-St Jeor formula.
+        Gives the same maintenance/loss/gain tiers as the calculator.net scrape,
+        without the network round-trip. Returns None when the change is not suggested, and
+        raises ValueError for a gender or activity level the formula can't place.
+        """
+        return calorie_requirement(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity)
+
+    def generate_calorie_requirements_batch(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity):
+        """
+        Vectorized version of generate_calorie_requirements. Every argument is an array with one
+        entry per user profile. Returns a float array with NaN where the change is not suggested.
+        """
+        return batch_calorie_requirements(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity)
+
+    @profiling.profiled("DietCraft.scrape_calorie_requirements")
+    def scrape_calorie_requirements(age, gender, height_feet, height_inch, weight, desired_weight, time_frame, activity):
+        """
+        Original calculator.net scrape. Kept as a reference implementation to check the
+        local engine against; only used on the request path when CALORIE_SOURCE=calculator.net.
+        """
+        # Imported here so app startup doesn't pay for them
+        import pandas as pd
+        from bs4 import BeautifulSoup
+
+        if not gender:
+            raise ValueError("A gender is required for the calorie calculator.")
+
         if activity == 'light':
             activity = 1.375
         elif activity == 'moderate':
@@ -148,11 +354,12 @@ class DietCraft:
         elif activity == 'active':
             activity = 1.55
 
-        url = f'https://www.calculator.net/calorie-calculator.html?cage={age}&csex={gender[0]}&cheightfeet={height_feet}&cheightinch={height_inch}&cpound={weight}&cheightmeter=180&ckg=65&cactivity={activity}&cmop=0&coutunit=c&cformula=m&cfatpct=20&printit=0&ctype=standard&x=Calculate'
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+        url = f'{CALCULATOR_URL}?cage={age}&csex={gender[0]}&cheightfeet={height_feet}&cheightinch={height_inch}&cpound={weight}&cheightmeter=180&ckg=65&cactivity={activity}&cmop=0&coutunit=c&cformula=m&cfatpct=20&printit=0&ctype=standard&x=Calculate'
+        response = calculator_client.get("calorie-calculator", url)
 
-        tables = soup.find_all('table')
+        with metrics.stage("calculator_parse"):
+            soup = BeautifulSoup(response.content, 'html.parser')
+            tables = soup.find_all('table')
         if not tables or len(tables) < 2:
             raise ValueError("Calorie calculator data tables are missing or incomplete.")
 
@@ -180,7 +387,7 @@ class DietCraft:
             weightloss_df = pd.DataFrame(data)
 
             total_weight_to_lose = weight - desired_weight
-            lbs_per_week = total_weight_to_lose / time_frame
+            lbs_per_week = total_weight_to_lose / time_frame if time_frame else float("inf")
 
             if 2.5 <= lbs_per_week:
                 return None  # Not Suggested
@@ -213,7 +420,7 @@ class DietCraft:
             weightgain_df = pd.DataFrame(data)
 
             total_weight_to_gain = desired_weight - weight
-            lbs_per_week = total_weight_to_gain / time_frame
+            lbs_per_week = total_weight_to_gain / time_frame if time_frame else float("inf")
 
             if 2.5 <= lbs_per_week:
                 return None  # Not Suggested
@@ -238,5 +445,23 @@ class DietCraft:
             protein = weight * .5
             return protein
 
-    def generate_shopping_list(weekly_diet_plan_df):
-       pass
\ No newline at end of file
+    def generate_shopping_list(weekly_diet_plan_df, api_key=None, information_bulk=None):
+        """
+        Builds the shopping list for a weekly plan.
+
+        Ingredients for all of the plan's recipes are fetched in one bulk request, converted to
+        base units (g / ml / piece) and totalled in a single groupby.
+
+        :param weekly_diet_plan_df: DataFrame of the plan's MealPlan rows (needs a recipe_id column)
+        :param api_key: Spoonacular API key, used when no information_bulk backend is given
+        :param information_bulk: Callable taking recipe ids and returning informationBulk-style recipes,
+                                 e.g. RecipeCorpus.information_bulk. Defaults to the live Spoonacular API.
+        :return: DataFrame with name, unit, amount and aisle columns
+        """
+        if information_bulk is None:
+            def information_bulk(ids):
+                return spoonacular.information_bulk(ids, api_key)
+
+        recipe_ids = sorted(int(i) for i in weekly_diet_plan_df["recipe_id"].dropna().unique())
+        ingredients = shopping.normalize_units(shopping.ingredients_frame(information_bulk(recipe_ids)))
+        return shopping.aggregate(weekly_diet_plan_df, ingredients)
@@ -0,0 +1,125 @@
+# modules/jobs.py
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+PENDING = (QUEUED, RUNNING)
+
+
+class JobError(Exception):
+    """Raised by a job to fail with a message meant for the user; other exceptions are reported generically."""
+
+
+class Job:
+    __slots__ = ("id", "key", "status", "error", "created_at", "finished_at")
+
+    def __init__(self, id, key, status=QUEUED, error=None, created_at=None, finished_at=None):
+        self.id = id
+        self.key = key
+        self.status = status
+        self.error = error
+        self.created_at = created_at
+        self.finished_at = finished_at
+
+    @property
+    def pending(self):
+        return self.status in PENDING
+
+    def to_dict(self):
+        return {"id": self.id, "status": self.status, "error": self.error}
+
+
+class JobQueue:
+    """
+    Background worker pool whose jobs are tracked in a database table, so that every process
+    (each gunicorn worker) sees the same jobs: any of them can answer a status poll, and a
+    second submit for the same key is de-duplicated even when it reaches another process.
+
+    `model` is the table's mapped class, with columns id, key, status, error, created_at and
+    finished_at, and a unique index on key limited to queued/running rows; that index is what
+    makes "one pending job per key" hold across processes. The job itself runs in this
+    process's thread pool.
+
+    Submitting while a job with the same key is still queued or running returns that job
+    instead of starting another one. Finished jobs are kept for `keep_seconds` so clients can
+    still poll their final status. A job still pending after `stale_seconds` is assumed lost
+    with the process that ran it, and is reported (and recorded) as failed.
+    """
+
+    def __init__(self, model, max_workers=2, keep_seconds=15 * 60, stale_seconds=10 * 60):
+        self.model = model
+        self.keep_seconds = keep_seconds
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+
+    def submit(self, engine, key, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) unless a job for `key` is already pending. Returns the Job."""
+        with engine.begin() as conn:
+            self._prune(conn)
+
+        job = Job(uuid.uuid4().hex, key, created_at=time.time())
+        for _ in range(3):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(self.model).values(
+                        id=job.id, key=key, status=QUEUED, created_at=job.created_at,
+                    ))
+            except IntegrityError:
+                # Another request (maybe in another process) got there first; hand back its job
+                with engine.connect() as conn:
+                    pending = conn.execute(self._select().where(
+                        self.model.key == key, self.model.status.in_(PENDING),
+                    )).first()
+                if pending is not None:
+                    return Job(*pending)
+                continue  # It finished in the meantime; try again
+            self._executor.submit(self._run, engine, job, fn, args, kwargs)
+            return job
+        raise RuntimeError(f"Could not queue a job for {key}")
+
+    def get(self, engine, job_id):
+        with engine.connect() as conn:
+            row = conn.execute(self._select().where(self.model.id == job_id)).first()
+        if row is None:
+            return None
+        job = Job(*row)
+        if job.pending and job.created_at < time.time() - self.stale_seconds:
+            job.status, job.error = FAILED, "Interrupted"
+        return job
+
+    def _select(self):
+        m = self.model
+        return select(m.id, m.key, m.status, m.error, m.created_at, m.finished_at)
+
+    def _set(self, engine, job_id, **values):
+        with engine.begin() as conn:
+            conn.execute(update(self.model).where(self.model.id == job_id).values(**values))
+
+    def _run(self, engine, job, fn, args, kwargs):
+        self._set(engine, job.id, status=RUNNING)
+        try:
+            fn(*args, **kwargs)
+        except JobError as e:
+            self._set(engine, job.id, status=FAILED, error=str(e)[:255], finished_at=time.time())
+        except Exception as e:
+            print(f"Job {job.id} failed: {e!r}")
+            self._set(engine, job.id, status=FAILED, error="Unexpected error", finished_at=time.time())
+        else:
+            self._set(engine, job.id, status=DONE, finished_at=time.time())
+
+    def _prune(self, conn):
+        now = time.time()
+        m = self.model
+        conn.execute(
+            update(m)
+            .where(m.status.in_(PENDING), m.created_at < now - self.stale_seconds)
+            .values(status=FAILED, error="Interrupted", finished_at=now)
+        )
+        conn.execute(delete(m).where(m.finished_at < now - self.keep_seconds))
@@ -0,0 +1,231 @@
+# modules/metrics.py
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+# Off unless METRICS_ENABLED=1; when off every hook returns straight away
+ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+# Each worker process keeps its own metrics. With several (gunicorn workers), set METRICS_DIR to a
+# directory they share: each worker writes its metrics there every METRICS_FLUSH_INTERVAL seconds
+# and /metrics, whichever worker answers it, reports the sum over all of them.
+METRICS_DIR = os.getenv("METRICS_DIR")
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+HELP = {
+    "dietcraft_stage_seconds": ("histogram", "Time spent in each DietCraft stage."),
+    "dietcraft_upstream_seconds": ("histogram", "Duration of upstream HTTP calls."),
+    "dietcraft_upstream_response_bytes": ("histogram", "Size of upstream HTTP response bodies."),
+    "dietcraft_upstream_requests_total": ("counter", "Upstream HTTP calls by service, endpoint and status."),
+    "dietcraft_http_request_seconds": ("histogram", "Duration of requests served by the app."),
+    "dietcraft_upstream_retries_total": ("counter", "Upstream calls retried after an error or retryable status."),
+    "dietcraft_upstream_coalesced_total": ("counter", "Upstream calls served by an identical call already in flight."),
+    "dietcraft_upstream_rejected_total": ("counter", "Upstream calls refused by the circuit breaker or quota."),
+    "dietcraft_upstream_quota_points_left": ("gauge", "Upstream API points left for the day."),
+    "dietcraft_stale_pools_total": ("counter", "Expired recipe pools served because the upstream failed."),
+    "dietcraft_recipe_cache_hits_total": ("counter", "Recipe pool cache lookups answered from the cache."),
+    "dietcraft_recipe_cache_misses_total": ("counter", "Recipe pool cache lookups that missed or found an expired entry."),
+    "dietcraft_recipe_cache_evictions_total": ("counter", "Recipe pools evicted to keep the cache under its size bound."),
+    "dietcraft_profiles_written_total": ("counter", "Sampled profiles written to PROFILE_DIR."),
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_buckets = {"dietcraft_upstream_response_bytes": BYTES_BUCKETS}
+_NOOP = nullcontext()
+_process_file = (None, None)  # (pid, path) of this process's file in METRICS_DIR
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    buckets = _buckets.get(name, DEFAULT_BUCKETS)
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(buckets) + 2)
+        index = bisect.bisect_left(buckets, value)  # first bucket with value <= le
+        if index < len(buckets):
+            histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+class _Stage:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("dietcraft_stage_seconds", time.perf_counter() - self.started, stage=self.stage)
+
+
+def stage(name):
+    """Context manager timing one stage (fetch, parse, assembly, DB write...)."""
+    return _Stage(name) if ENABLED else _NOOP
+
+
+def record_upstream(service, endpoint, status, nbytes, seconds):
+    """Records one upstream HTTP call. Use status "error" for calls that raised."""
+    if not ENABLED:
+        return
+    inc("dietcraft_upstream_requests_total", service=service, endpoint=endpoint, status=str(status))
+    observe("dietcraft_upstream_seconds", seconds, service=service, endpoint=endpoint)
+    observe("dietcraft_upstream_response_bytes", nbytes, service=service, endpoint=endpoint)
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+def _snapshot():
+    with _lock:
+        return dict(_counters), dict(_gauges), {key: list(values) for key, values in _histograms.items()}
+
+
+def flush():
+    """Writes this process's metrics to its file in METRICS_DIR."""
+    global _process_file
+    if not ENABLED or not METRICS_DIR:
+        return
+    pid, path = _process_file
+    if pid != os.getpid():
+        # A new file per process, so a restarted worker never overwrites the counts of the one before
+        pid = os.getpid()
+        path = os.path.join(METRICS_DIR, f"{pid}-{uuid.uuid4().hex[:8]}.json")
+        _process_file = (pid, path)
+
+    counters, gauges, histograms = _snapshot()
+    data = {
+        kind: [[name, labels, values] for (name, labels), values in metrics.items()]
+        for kind, metrics in (("counters", counters), ("gauges", gauges), ("histograms", histograms))
+    }
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)  # Readers never see a half-written file
+
+
+def _merged():
+    """Metrics of every process that wrote to METRICS_DIR: counters and histograms summed, newest gauges."""
+    flush()
+    counters, gauges, histograms = {}, {}, {}
+    files = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:  # Removed in the meantime
+            continue
+    for _, path in sorted(files):  # Oldest first, so the newest value of a gauge wins
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in data["gauges"]:
+            gauges[(name, tuple(map(tuple, labels)))] = value
+        for name, labels, values in data["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)] if key in histograms else values
+    return counters, gauges, histograms
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Could not write metrics to {METRICS_DIR}: {e}")
+
+
+def worker_started():
+    """
+    For gunicorn's post_fork hook: drops the metrics inherited from the master, which would
+    otherwise be counted once per worker, and starts writing this worker's to METRICS_DIR.
+    """
+    reset()
+    if ENABLED and METRICS_DIR:
+        threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush").start()
+
+
+def clear_dir():
+    """Removes the files of earlier runs from METRICS_DIR, so counters start from zero with the server."""
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+            os.remove(path)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format, summed over the processes in METRICS_DIR if set."""
+    counters, gauges, histograms = _merged() if METRICS_DIR else _snapshot()
+    counters.update(gauges)
+
+    lines = []
+    for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        buckets = _buckets.get(name, DEFAULT_BUCKETS)
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
@@ -0,0 +1,141 @@
+# modules/migrations.py
+import re
+
+from sqlalchemy import text
+
+# Registered migrations as (version, description, function taking a connection), in order
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Registers a schema change for existing databases. Versions must be unique and increasing."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def applied_versions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description TEXT NOT NULL)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine, log=print):
+    """
+    Applies every registered migration not yet recorded in schema_migrations.
+    Each migration runs in its own transaction together with its bookkeeping row.
+    Run after db.create_all(), so migrations only need to handle tables that already existed.
+    """
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description},
+            )
+        log(f"Applied migration {version}: {description}")
+
+
+def has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute(text(f"PRAGMA table_info({table})")))
+
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, skipped when create_all already made the column on a new database."""
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+@migration(1, "Composite index on meal_plans (user_id, day, meal_type)")
+def add_meal_plan_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_meal_plans_user_day_meal ON meal_plans (user_id, day, meal_type)"
+    ))
+
+
+@migration(2, "Settings fingerprint for the stored requirements snapshot")
+def add_requirements_fingerprint(conn):
+    add_column(conn, "users", "requirements_fingerprint", "VARCHAR(40)")
+
+
+@migration(3, "Spoonacular recipe id on meal_plans")
+def add_meal_plan_recipe_id(conn):
+    add_column(conn, "meal_plans", "recipe_id", "INTEGER")
+
+    # Backfill from the recipe URL, which ends in -<id>
+    rows = conn.execute(text("SELECT id, url FROM meal_plans WHERE url IS NOT NULL AND recipe_id IS NULL")).all()
+    updates = []
+    for row_id, url in rows:
+        match = re.search(r"-(\d+)$", url)
+        if match:
+            updates.append({"id": row_id, "recipe_id": int(match.group(1))})
+    if updates:
+        conn.execute(text("UPDATE meal_plans SET recipe_id = :recipe_id WHERE id = :id"), updates)
+
+
+@migration(4, "Plan version on users, bumped whenever the plan is rewritten")
+def add_plan_version(conn):
+    add_column(conn, "users", "plan_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(5, "Shared recipes table; meal_plans reference it by foreign key")
+def normalize_recipes(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER NOT NULL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            url VARCHAR(255),
+            calories FLOAT NOT NULL,
+            protein FLOAT NOT NULL
+        )
+    """))
+    # One recipes row per Spoonacular id, taken from the plans already using it
+    conn.execute(text("""
+        INSERT OR IGNORE INTO recipes (id, title, url, calories, protein)
+        SELECT recipe_id, COALESCE(title, ''), url, COALESCE(calories, 0), COALESCE(protein, 0)
+        FROM meal_plans WHERE recipe_id IS NOT NULL
+        GROUP BY recipe_id
+    """))
+
+    if any(row[2] == "recipes" for row in conn.execute(text("PRAGMA foreign_key_list(meal_plans)"))):
+        # Created by create_all with the new schema; just drop the copied recipe fields
+        conn.execute(text(
+            "UPDATE meal_plans SET title = NULL, calories = NULL, protein = NULL, url = NULL "
+            "WHERE recipe_id IS NOT NULL"
+        ))
+        return
+
+    # SQLite can't add a foreign key or drop NOT NULL in place, so rebuild the table
+    conn.execute(text("""
+        CREATE TABLE meal_plans_new (
+            id INTEGER NOT NULL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            day VARCHAR(20) NOT NULL,
+            meal_type VARCHAR(20) NOT NULL,
+            recipe_id INTEGER REFERENCES recipes (id),
+            title VARCHAR(255),
+            calories INTEGER,
+            protein INTEGER,
+            url VARCHAR(255),
+            custom_meal_title VARCHAR(255),
+            custome_meal_calories INTEGER,
+            custom_meal_protein INTEGER
+        )
+    """))
+    recipe_fields = {"title", "calories", "protein", "url"}
+    new_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(meal_plans_new)"))}
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(meal_plans)")) if row[1] in new_columns]
+    values = [f"CASE WHEN recipe_id IS NULL THEN {c} END" if c in recipe_fields else c for c in columns]
+    conn.execute(text(
+        f"INSERT INTO meal_plans_new ({', '.join(columns)}) SELECT {', '.join(values)} FROM meal_plans"
+    ))
+    conn.execute(text("DROP TABLE meal_plans"))
+    conn.execute(text("ALTER TABLE meal_plans_new RENAME TO meal_plans"))
+    conn.execute(text("CREATE INDEX ix_meal_plans_user_day_meal ON meal_plans (user_id, day, meal_type)"))
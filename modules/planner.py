@@ -0,0 +1,194 @@
+# modules/planner.py
+import time
+from collections import deque
+
+import numpy as np
+
+# How many of the best-scoring recipes per meal are considered when combining a day
+DEFAULT_CANDIDATES = 24
+
+
+def slot_costs(calories, protein, target_calories, target_protein):
+    """Relative deviation of every recipe in a pool from one meal slot's calorie/protein target."""
+    return (
+        np.abs(calories - target_calories) / max(target_calories, 1)
+        + np.abs(protein - target_protein) / max(target_protein, 1)
+    )
+
+
+def plan_week(pools, slot_targets, daily_calories, daily_protein, days=7, max_uses=4,
+              variety_weight=0.05, candidates=DEFAULT_CANDIDATES, time_budget=0.05):
+    """
+    Assigns one recipe per meal slot per day, minimising how far each day's totals land
+    from the daily calorie/protein targets.
+
+    Each meal's pool is cut down to its best `candidates` recipes by slot score, then every
+    day scores all breakfast x lunch x dinner combinations at once as a NumPy cost tensor and
+    takes the cheapest one that respects the repeat limits (a recipe is used at most `max_uses`
+    times a week and at most once a day). A small `variety_weight` penalty per previous use
+    spreads the week over near-equal options. If solving takes longer than `time_budget`
+    seconds, the remaining days fall back to the best available recipe per slot.
+
+    :param pools: {meal: (ids, calories, protein)} with one NumPy array per column
+    :param slot_targets: {meal: (calories, protein)} target for a single slot
+    :param daily_calories: Calories the meals of one day should add up to
+    :param daily_protein: Protein the meals of one day should add up to
+    :return: List with one {meal: pool index or None} dict per day
+    """
+    return list(iter_plan(pools, slot_targets, daily_calories, daily_protein, days=days, window=days,
+                          max_uses=max_uses, variety_weight=variety_weight, candidates=candidates,
+                          time_budget=time_budget))
+
+
+def iter_plan(pools, slot_targets, daily_calories, daily_protein, days=None, window=7, max_uses=4,
+              variety_weight=0.05, candidates=DEFAULT_CANDIDATES, time_budget=None):
+    """
+    Lazily yields one {meal: pool index or None} dict per day, solved like plan_week.
+
+    The repeat limit applies over a sliding window: a recipe is used at most `max_uses` times in
+    any `window` consecutive days. Only the last `window` days are remembered, so memory stays
+    flat however long the horizon is.
+
+    :param days: Number of days to yield, or None to keep going until the caller stops
+    :param time_budget: Seconds after which the remaining days use the per-slot fallback (None: no limit)
+    """
+    started = time.perf_counter()
+    meals = list(pools)
+    usage = {}
+    recent = deque()  # recipe ids picked on each of the last `window` days
+    shortlist = _shortlist(pools, slot_targets, candidates)
+    active = [meal for meal in meals if meal in shortlist]
+
+    day = 0
+    while days is None or day < days:
+        day += 1
+        choice = dict.fromkeys(meals)
+        if not active:
+            yield choice
+            continue
+
+        penalties = _penalties(active, shortlist, usage, max_uses, variety_weight)
+
+        picked = {}
+        if time_budget is None or time.perf_counter() - started <= time_budget:
+            picked = _best_combination(active, shortlist, penalties, daily_calories, daily_protein)
+        if not picked:
+            # Out of time (or no full combination left): best available recipe per slot
+            picked = _best_per_slot(active, shortlist, penalties)
+        choice.update(picked)
+
+        picked_ids = [pools[meal][0][choice[meal]] for meal in active if choice[meal] is not None]
+        for recipe_id in picked_ids:
+            usage[recipe_id] = usage.get(recipe_id, 0) + 1
+        recent.append(picked_ids)
+        if len(recent) >= window:
+            # The oldest day leaves the window before the next day is solved
+            for recipe_id in recent.popleft():
+                usage[recipe_id] -= 1
+                if not usage[recipe_id]:
+                    del usage[recipe_id]
+        yield choice
+
+
+def plan_day(pools, slot_targets, daily_calories, daily_protein, usage, taken=(), max_uses=4,
+             variety_weight=0.05, candidates=DEFAULT_CANDIDATES):
+    """
+    Re-solves some meal slots of a single day while the rest of the week stays fixed.
+
+    Works like one day of plan_week, with the repeat limits seeded from `usage`.
+
+    :param pools: {meal: (ids, calories, protein)} for just the slots being replaced
+    :param daily_calories: Calories these slots should add up to (the day's target minus the meals kept)
+    :param daily_protein: Protein these slots should add up to
+    :param usage: {recipe_id: uses} over the slots of the week that are kept
+    :param taken: Recipe ids that can't be picked, e.g. the day's kept meals or the recipe being swapped out
+    :return: {meal: pool index or None}
+    """
+    shortlist = _shortlist(pools, slot_targets, candidates)
+    active = [meal for meal in pools if meal in shortlist]
+    choice = dict.fromkeys(pools)
+    if not active:
+        return choice
+
+    taken = set(taken)
+    penalties = [
+        np.where(np.isin(shortlist[meal][1], list(taken)), np.inf, penalty) if taken else penalty
+        for meal, penalty in zip(active, _penalties(active, shortlist, usage, max_uses, variety_weight))
+    ]
+    picked = _best_combination(active, shortlist, penalties, daily_calories, daily_protein)
+    choice.update(picked or _best_per_slot(active, shortlist, penalties))
+    return choice
+
+
+def _shortlist(pools, slot_targets, candidates):
+    """Per meal: the best `candidates` indices into the pool by slot score, plus their ids and macros."""
+    shortlist = {}
+    for meal, (ids, calories, protein) in pools.items():
+        if len(ids) == 0:
+            continue
+        target_calories, target_protein = slot_targets[meal]
+        cost = slot_costs(calories, protein, target_calories, target_protein)
+        k = min(candidates, len(ids))
+        best = np.argpartition(cost, k - 1)[:k]
+        best = best[np.argsort(cost[best], kind="stable")]
+        shortlist[meal] = (best, ids[best], calories[best], protein[best])
+    return shortlist
+
+
+def _penalties(active, shortlist, usage, max_uses, variety_weight):
+    """Per-candidate penalty from usage so far; exhausted recipes are ruled out entirely."""
+    penalties = []
+    for meal in active:
+        used = np.array([usage.get(i, 0) for i in shortlist[meal][1]], dtype=float)
+        penalties.append(np.where(used >= max_uses, np.inf, used * variety_weight))
+    return penalties
+
+
+def _best_per_slot(active, shortlist, penalties):
+    """Picks the best-ranked available candidate for each meal on its own, still honouring the repeat limits."""
+    picked = {}
+    used_today = set()
+    for meal, penalty in zip(active, penalties):
+        best, ids = shortlist[meal][0], shortlist[meal][1]
+        for j in np.argsort(penalty, kind="stable"):
+            if np.isfinite(penalty[j]) and ids[j] not in used_today:
+                picked[meal] = int(best[j])
+                used_today.add(ids[j])
+                break
+    return picked
+
+
+def _best_combination(active, shortlist, penalties, daily_calories, daily_protein):
+    """Scores every combination of one candidate per meal and returns {meal: pool index} for the cheapest."""
+    n = len(active)
+    total_calories = 0.0
+    total_protein = 0.0
+    cost = 0.0
+    for axis, meal in enumerate(active):
+        shape = [1] * n
+        shape[axis] = -1
+        total_calories = total_calories + shortlist[meal][2].reshape(shape)
+        total_protein = total_protein + shortlist[meal][3].reshape(shape)
+        cost = cost + penalties[axis].reshape(shape)
+
+    cost = cost + (
+        np.abs(total_calories - daily_calories) / max(daily_calories, 1)
+        + np.abs(total_protein - daily_protein) / max(daily_protein, 1)
+    )
+
+    # The same recipe can't appear twice on one day (lunch and dinner pools overlap)
+    for a in range(n):
+        for b in range(a + 1, n):
+            shape_a = [1] * n
+            shape_a[a] = -1
+            shape_b = [1] * n
+            shape_b[b] = -1
+            same = shortlist[active[a]][1].reshape(shape_a) == shortlist[active[b]][1].reshape(shape_b)
+            cost = np.where(same, np.inf, cost)
+
+    cost = np.broadcast_to(cost, [len(shortlist[meal][0]) for meal in active])
+    flat = int(np.argmin(cost))
+    if not np.isfinite(cost.flat[flat]):
+        return {}
+    index = np.unravel_index(flat, cost.shape)
+    return {meal: int(shortlist[meal][0][index[axis]]) for axis, meal in enumerate(active)}
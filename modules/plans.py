@@ -0,0 +1,321 @@
+# modules/plans.py
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from modules import metrics
+
+
+def meal_plan_rows(user_id, weekly_meals):
+    """Flattens a generate_weekly_meals result into MealPlan column dicts."""
+    return [
+        {
+            "user_id": user_id,
+            "day": day,
+            "meal_type": meal_type,
+            "recipe_id": details.get("id"),
+            "title": details["title"],
+            "calories": details["calories"],
+            "protein": details["protein"],
+            "url": details["url"],
+        }
+        for day, daily_meals in weekly_meals.items()
+        for meal_type, details in daily_meals.items()
+    ]
+
+
+# Recipe fields stored once in the recipes table instead of on every plan row
+RECIPE_FIELDS = ("title", "url", "calories", "protein")
+
+
+def split_recipes(rows):
+    """
+    Moves recipe fields off meal_plan_rows output.
+
+    :return: (plan rows with recipe fields cleared where there is a recipe_id, unique recipe rows)
+    """
+    recipes = {}
+    plan_rows = []
+    for row in rows:
+        if row.get("recipe_id") is None:
+            plan_rows.append(row)
+            continue
+        recipes[row["recipe_id"]] = {"id": row["recipe_id"], **{field: row[field] for field in RECIPE_FIELDS}}
+        plan_rows.append({**row, **dict.fromkeys(RECIPE_FIELDS)})
+    return plan_rows, list(recipes.values())
+
+
+def upsert_recipes(session, Recipe, recipes):
+    """Inserts recipes not stored yet; existing rows are kept as they are."""
+    if not recipes:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        session.execute(dialect_insert(Recipe).on_conflict_do_nothing(index_elements=["id"]), recipes)
+        return
+    stored = set(session.scalars(select(Recipe.id).where(Recipe.id.in_([r["id"] for r in recipes]))))
+    missing = [recipe for recipe in recipes if recipe["id"] not in stored]
+    if missing:
+        session.execute(insert(Recipe), missing)
+
+
+def plan_entries(session, MealPlan, Recipe, user_id):
+    """A user's plan rows in slot order, with the recipe fields filled in from the recipes table."""
+    return session.execute(
+        select(
+            MealPlan.id,
+            MealPlan.day,
+            MealPlan.meal_type,
+            MealPlan.recipe_id,
+            *(func.coalesce(getattr(Recipe, field), getattr(MealPlan, field)).label(field) for field in RECIPE_FIELDS),
+        )
+        .outerjoin(Recipe, Recipe.id == MealPlan.recipe_id)
+        .where(MealPlan.user_id == user_id)
+        .order_by(MealPlan.id)
+    ).all()
+
+
+# One meal slot of an archived plan; recipe fields are None for recipes until archived_plan fills them in
+PlanEntry = namedtuple("PlanEntry", ("day", "meal_type", "recipe_id", *RECIPE_FIELDS))
+
+# Bump when the layout of encoded snapshots changes; decode_plan reads every older layout
+SNAPSHOT_FORMAT = 1
+
+
+def encode_plan(entries):
+    """
+    Compact snapshot of one plan: zlib-compressed JSON with one short list per meal slot.
+    Slots with a recipe only carry its id (the meal_plans row leaves the fields to the recipes
+    table), so a week of 28 slots takes a few hundred bytes.
+    """
+    slots = [list(entry) for entry in entries]
+    return zlib.compress(json.dumps([SNAPSHOT_FORMAT, slots], separators=(",", ":")).encode())
+
+
+def decode_plan(payload):
+    """Inverse of encode_plan: a list of PlanEntry."""
+    _, slots = json.loads(zlib.decompress(payload))
+    return [PlanEntry(*slot) for slot in slots]
+
+
+def archive_plans(session, MealPlan, PlanArchive, User, user_ids):
+    """
+    Copies the stored plans of `user_ids` into PlanArchive, one snapshot per user tagged with the
+    plan_version it had. Users without a plan are skipped. Does not commit.
+    """
+    snapshots = {}
+    for user_id, *fields in session.execute(
+        select(MealPlan.user_id, MealPlan.day, MealPlan.meal_type, MealPlan.recipe_id,
+               *(getattr(MealPlan, field) for field in RECIPE_FIELDS))
+        .where(MealPlan.user_id.in_(user_ids))
+        .order_by(MealPlan.user_id, MealPlan.id)
+    ):
+        snapshots.setdefault(user_id, []).append(PlanEntry(*fields))
+    if not snapshots:
+        return
+
+    versions = dict(session.execute(select(User.id, User.plan_version).where(User.id.in_(list(snapshots)))).all())
+    archived_at = time.time()
+    session.execute(insert(PlanArchive), [
+        {
+            "user_id": user_id,
+            "version": versions.get(user_id) or 0,
+            "archived_at": archived_at,
+            "meal_count": len(entries),
+            "payload": encode_plan(entries),
+        }
+        for user_id, entries in snapshots.items()
+    ])
+
+
+def plan_history(session, PlanArchive, user_id, before=None, limit=20):
+    """
+    One page of a user's archived plans, newest first, without their payloads.
+
+    Keyset-paginated on (user_id, version), so every page is one index range scan however many
+    plans the user has archived.
+
+    :param before: Only versions older than this; pass the previous page's cursor
+    :return: (rows with version, archived_at and meal_count; cursor for the next page or None)
+    """
+    query = (
+        select(PlanArchive.version, PlanArchive.archived_at, PlanArchive.meal_count)
+        .where(PlanArchive.user_id == user_id)
+    )
+    if before is not None:
+        query = query.where(PlanArchive.version < before)
+    rows = session.execute(query.order_by(PlanArchive.version.desc()).limit(limit + 1)).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].version
+    return rows, None
+
+
+def archived_plan(session, PlanArchive, Recipe, user_id, version):
+    """
+    One archived plan in the generate_weekly_meals shape, with recipe fields filled in from the
+    recipes table, or None if the user has no such version.
+    """
+    payload = session.scalar(
+        select(PlanArchive.payload).where(PlanArchive.user_id == user_id, PlanArchive.version == version)
+    )
+    if payload is None:
+        return None
+    entries = decode_plan(payload)
+    recipe_ids = {entry.recipe_id for entry in entries if entry.recipe_id is not None}
+    recipes = {}
+    if recipe_ids:
+        recipes = {
+            row.id: row
+            for row in session.execute(
+                select(Recipe.id, *(getattr(Recipe, field) for field in RECIPE_FIELDS)).where(Recipe.id.in_(recipe_ids))
+            )
+        }
+    entries = [
+        entry._replace(**{field: getattr(recipes[entry.recipe_id], field) for field in RECIPE_FIELDS})
+        if entry.recipe_id in recipes else entry
+        for entry in entries
+    ]
+    return weekly_meals_from_plans(entries)
+
+
+def weekly_meals_from_plans(meal_plans):
+    """Rebuilds the generate_weekly_meals shape from plan_entries rows."""
+    weekly_meals = {}
+    for plan in meal_plans:
+        weekly_meals.setdefault(plan.day, {})[plan.meal_type] = {
+            "id": plan.recipe_id,
+            "title": plan.title,
+            "calories": plan.calories,
+            "protein": plan.protein,
+            "url": plan.url,
+        }
+    return weekly_meals
+
+
+# Callbacks run with the affected user ids after plans are replaced (e.g. to drop cached data)
+_replace_hooks = []
+
+
+def on_replace(fn):
+    """Registers fn(user_ids) to be called after replace_meal_plans or replace_meal_slots commits."""
+    _replace_hooks.append(fn)
+    return fn
+
+
+def bump_plan_versions(session, User, user_ids):
+    """Increments users.plan_version, which versions the plan for conditional requests."""
+    session.execute(
+        update(User).where(User.id.in_(user_ids)).values(plan_version=User.plan_version + 1),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def replace_meal_plans(session, MealPlan, user_ids, rows, User=None, Recipe=None, PlanArchive=None):
+    """
+    Swaps the stored plans of `user_ids` for `rows` in a single transaction:
+    one bulk DELETE, one executemany INSERT, one commit. With `User`, the users'
+    plan_version is bumped in the same transaction. With `Recipe`, recipe fields go
+    to the shared recipes table and the plan rows only reference them. With `PlanArchive`
+    (and `User`), the plans being replaced are archived first, so meal_plans only ever holds
+    the current plans.
+    """
+    user_ids = list(user_ids)
+    try:
+        with metrics.stage("db_write"):
+            if PlanArchive is not None and User is not None:
+                archive_plans(session, MealPlan, PlanArchive, User, user_ids)
+            if Recipe is not None:
+                rows, recipes = split_recipes(rows)
+                upsert_recipes(session, Recipe, recipes)
+            session.execute(delete(MealPlan).where(MealPlan.user_id.in_(user_ids)))
+            if rows:
+                session.execute(insert(MealPlan), rows)
+            if User is not None:
+                bump_plan_versions(session, User, user_ids)
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    for hook in _replace_hooks:
+        hook(user_ids)
+
+
+def replace_meal_slots(session, MealPlan, user_id, rows, User=None, Recipe=None):
+    """
+    Rewrites only the (day, meal_type) slots present in `rows` for one user, in place, leaving
+    the rest of the week untouched. Same single transaction, version bump, recipes table and
+    hooks as replace_meal_plans. A swap edits the current plan, so nothing is archived.
+    """
+    slots = [(row["day"], row["meal_type"]) for row in rows]
+    try:
+        with metrics.stage("db_write"):
+            if Recipe is not None:
+                rows, recipes = split_recipes(rows)
+                upsert_recipes(session, Recipe, recipes)
+            existing = {
+                (day, meal_type): plan_id
+                for day, meal_type, plan_id in session.execute(
+                    select(MealPlan.day, MealPlan.meal_type, MealPlan.id).where(
+                        MealPlan.user_id == user_id,
+                        tuple_(MealPlan.day, MealPlan.meal_type).in_(slots),
+                    )
+                )
+            }
+            updates = [{**row, "id": existing[slot]} for slot, row in zip(slots, rows) if slot in existing]
+            inserts = [row for slot, row in zip(slots, rows) if slot not in existing]
+            if updates:
+                session.execute(update(MealPlan), updates)
+            if inserts:
+                session.execute(insert(MealPlan), inserts)
+            if User is not None:
+                bump_plan_versions(session, User, [user_id])
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    for hook in _replace_hooks:
+        hook([user_id])
+
+
+MEMO_SIZE = 4096  # users whose rendered plan RenderedPlanCache keeps
+
+
+class RenderedPlanCache:
+    """
+    Each user's plan rendered as JSON, valid only for the plan_version it was rendered from.
+    Holds at most `size` users; the least recently used are dropped first.
+    """
+
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()  # user_id -> (plan_version, body)
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._plans.get(user_id)
+            if entry is not None:
+                self._plans.move_to_end(user_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def set(self, user_id, version, body):
+        with self._lock:
+            self._plans[user_id] = (version, body)
+            self._plans.move_to_end(user_id)
+            if len(self._plans) > self.size:
+                self._plans.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._plans.pop(user_id, None)
@@ -0,0 +1,179 @@
+# modules/profiling.py
+import cProfile
+import functools
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from modules import metrics
+
+# What may be profiled, comma-separated: endpoints ("main.profile") and functions decorated with
+# profiled() ("DietCraft.generate_weekly_meals"). Off unless PROFILE_TARGETS is set and
+# PROFILE_SAMPLE_RATE > 0.
+TARGETS = frozenset(t.strip() for t in os.getenv("PROFILE_TARGETS", "").split(",") if t.strip())
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of calls profiled, 0 to 1
+ENABLED = bool(TARGETS) and SAMPLE_RATE > 0
+
+# "collapsed": stack samples, one "frame;frame;frame count" line per stack (flamegraph.pl, speedscope)
+# "pstats": cProfile output, for `python -m pstats` or snakeviz
+FORMAT = os.getenv("PROFILE_FORMAT", "collapsed")
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(_BASE_DIR, "data", "profiles"))
+MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", 50 * 1024 * 1024))  # Oldest files are deleted beyond this
+INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # Seconds between stack samples
+
+_NOOP = nullcontext()
+_sequence = itertools.count()
+_rotate_lock = threading.Lock()
+_active = threading.local()  # Set while a profile runs on the thread; nested targets are skipped
+
+
+def _frame_label(code):
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a helper thread and counts
+    each distinct stack, root frame first. The profiled thread itself runs uninstrumented.
+    """
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _Profile:
+    """Profiles the current thread while active and writes one file to PROFILE_DIR on exit."""
+
+    def __init__(self, target):
+        self.target = target
+        self.profiler = None
+
+    def __enter__(self):
+        if getattr(_active, "profile", None) is not None:
+            return self
+        _active.profile = self
+        self.started = time.perf_counter()
+        if FORMAT == "pstats":
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Another profiler is already active on this thread
+                self.profiler = None
+        else:
+            self.profiler = StackSampler(threading.get_ident())
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if getattr(_active, "profile", None) is not self:
+            return False
+        _active.profile = None
+        if self.profiler is None:
+            return False
+        if FORMAT == "pstats":
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        elapsed_ms = 1000 * (time.perf_counter() - self.started)
+        extension = "prof" if FORMAT == "pstats" else "collapsed"
+        name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{self.target.replace('.', '_')}-{os.getpid()}-"
+                f"{next(_sequence)}-{elapsed_ms:.0f}ms.{extension}")
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, name)
+            if FORMAT == "pstats":
+                self.profiler.dump_stats(path)
+            else:
+                self.profiler.write(path)
+            rotate(PROFILE_DIR, MAX_BYTES)
+        except OSError as e:
+            print(f"Could not write profile {name}: {e}")
+            return False
+        metrics.inc("dietcraft_profiles_written_total", target=self.target)
+        return False
+
+
+def sample(target):
+    """
+    Context manager profiling the enclosed code for a sampled share of calls when `target` is
+    one of PROFILE_TARGETS. Otherwise it does nothing, and costs one set lookup.
+    """
+    if not ENABLED or target not in TARGETS or random.random() >= SAMPLE_RATE:
+        return _NOOP
+    return _Profile(target)
+
+
+def profiled(target):
+    """Decorator form of sample(). Functions whose target isn't configured are returned untouched."""
+    def decorate(fn):
+        if not ENABLED or target not in TARGETS:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with sample(target):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def wrap_views(app):
+    """
+    Wraps the view of every endpoint in PROFILE_TARGETS, so other routes run exactly as before.
+    A streamed response is only profiled up to the point its generator is returned.
+    """
+    for endpoint in TARGETS:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = profiled(endpoint)(app.view_functions[endpoint])
+
+
+def rotate(directory, max_bytes):
+    """Deletes the oldest profiles until the directory holds at most `max_bytes`."""
+    with _rotate_lock:
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith((".prof", ".collapsed")):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size, entry.path))
+        total = sum(size for _, _, size, _ in files)
+        for _, _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # Removed by another worker
+                pass
+            total -= size
@@ -0,0 +1,128 @@
+# modules/recipe_cache.py
+import json
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from modules import metrics
+
+# Bump when the format of cached payloads changes, so stale entries are never read back
+PAYLOAD_VERSION = 2
+
+
+class RecipeCache:
+    """
+    Persistent cache for Spoonacular complexSearch results, stored in SQLite.
+    Payloads are the compact RecipeStore rows, not the raw API JSON.
+
+    Entries are keyed by meal type and a quantized calorie/protein range, so users with
+    nearby targets share one cached recipe pool. Entries expire after `ttl` seconds and the
+    table is kept under `max_entries` rows by evicting the least recently used entries.
+    """
+
+    def __init__(self, path, ttl=24 * 60 * 60, max_entries=500, calorie_step=50, protein_step=5):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.calorie_step = calorie_step
+        self.protein_step = protein_step
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recipe_pools (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_recipe_pools_last_used ON recipe_pools (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def quantize(self, min_calories, max_calories, min_protein):
+        """Widens a query range out to the bucket edges so nearby targets map to the same query."""
+        return (
+            int(math.floor(min_calories / self.calorie_step) * self.calorie_step),
+            int(math.ceil(max_calories / self.calorie_step) * self.calorie_step),
+            int(math.floor(min_protein / self.protein_step) * self.protein_step),
+        )
+
+    def key(self, meal, types, min_calories, max_calories, min_protein):
+        """Cache key for an already quantized query."""
+        return f"v{PAYLOAD_VERSION}|{meal}|{','.join(types)}|{min_calories}-{max_calories}|{min_protein}"
+
+    def get(self, key, allow_stale=False, count=True):
+        """
+        Returns the cached results for `key`, or None on a miss or expired entry.
+
+        Expired entries stay stored until they are replaced or evicted, so with `allow_stale`
+        they can still be served when the upstream is down. `count=False` leaves the hit/miss
+        stats alone, for a second look at a key whose lookup was already counted.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload, created_at FROM recipe_pools WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl and not allow_stale:
+                row = None
+            if row is not None:
+                conn.execute("UPDATE recipe_pools SET last_used = ? WHERE key = ?", (now, key))
+
+        if not count:
+            return None if row is None else json.loads(row[0])
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            metrics.inc("dietcraft_recipe_cache_misses_total")
+            return None
+        with self._lock:
+            self.hits += 1
+        metrics.inc("dietcraft_recipe_cache_hits_total")
+        return json.loads(row[0])
+
+    def set(self, key, results):
+        """Stores results under `key` and evicts least recently used entries over the size bound."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recipe_pools (key, payload, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now),
+            )
+            evicted = conn.execute(
+                """
+                DELETE FROM recipe_pools WHERE key IN (
+                    SELECT key FROM recipe_pools ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+            metrics.inc("dietcraft_recipe_cache_evictions_total", evicted)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM recipe_pools")
+
+    def stats(self):
+        with self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM recipe_pools").fetchone()[0]
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": size}
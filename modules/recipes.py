@@ -0,0 +1,110 @@
+# modules/recipes.py
+import numpy as np
+
+# Nutrients kept from the Spoonacular payload, in column order
+NUTRIENT_COLUMNS = ("Calories", "Protein")
+NUTRIENT_INDEX = {name: column for column, name in enumerate(NUTRIENT_COLUMNS)}
+
+
+def recipe_url(recipe_id, title):
+    """Spoonacular page URL built from the recipe title slug and id."""
+    return f'https://spoonacular.com/recipes/{title.replace(" ", "-")}-{recipe_id}'
+
+
+class Recipe:
+    """Lightweight view of one row of a RecipeStore."""
+
+    __slots__ = ("id", "title", "url", "calories", "protein")
+
+    def __init__(self, id, title, url, calories, protein):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.calories = calories
+        self.protein = protein
+
+    def __repr__(self):
+        return f"Recipe({self.id}, {self.title!r})"
+
+
+class RecipeStore:
+    """
+    Compact, column-oriented store for a pool of recipes.
+
+    API results are parsed once into fixed columns (ids, titles, URLs, ingredient names and a
+    float matrix with one column per entry of NUTRIENT_COLUMNS); the rest of the Spoonacular
+    payload is dropped.
+    Nutrient lookups are plain array indexing, and the planner can use the columns directly.
+    """
+
+    __slots__ = ("ids", "titles", "urls", "ingredients", "nutrients")
+
+    def __init__(self, ids, titles, urls, nutrients, ingredients=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.titles = list(titles)
+        self.urls = list(urls)
+        # Ingredient names per recipe, used to spot near-duplicate recipes; empty when unknown
+        if ingredients is None:
+            ingredients = [[] for _ in self.titles]
+        self.ingredients = [list(names) for names in ingredients]
+        self.nutrients = np.asarray(nutrients, dtype=float).reshape(len(self.ids), len(NUTRIENT_COLUMNS))
+
+    @classmethod
+    def from_api(cls, results):
+        """Builds a store from complexSearch `results` (requested with addRecipeNutrition)."""
+        ids, titles, urls, ingredients = [], [], [], []
+        nutrients = np.zeros((len(results), len(NUTRIENT_COLUMNS)))
+        for row, recipe in enumerate(results):
+            ids.append(recipe["id"])
+            titles.append(recipe["title"])
+            urls.append(recipe_url(recipe["id"], recipe["title"]))
+            nutrition = recipe.get("nutrition", {})
+            for n in nutrition.get("nutrients", []):
+                column = NUTRIENT_INDEX.get(n["name"])
+                if column is not None:
+                    nutrients[row, column] = n["amount"]
+            ingredients.append([i["name"].lower() for i in nutrition.get("ingredients", []) if i.get("name")])
+        return cls(ids, titles, urls, nutrients, ingredients)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Inverse of to_rows. Rows cached before ingredients were kept have none."""
+        end = 3 + len(NUTRIENT_COLUMNS)
+        return cls(
+            [r[0] for r in rows],
+            [r[1] for r in rows],
+            [r[2] for r in rows],
+            [r[3:end] for r in rows] if rows else np.zeros((0, len(NUTRIENT_COLUMNS))),
+            [r[end] if len(r) > end else [] for r in rows],
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], np.zeros((0, len(NUTRIENT_COLUMNS))))
+
+    def to_rows(self):
+        """Plain lists ([id, title, url, *nutrients, ingredients]) for JSON serialization."""
+        return [
+            [int(recipe_id), title, url, *values, ingredients]
+            for recipe_id, title, url, values, ingredients in zip(
+                self.ids, self.titles, self.urls, self.nutrients.tolist(), self.ingredients
+            )
+        ]
+
+    @property
+    def calories(self):
+        return self.nutrients[:, NUTRIENT_INDEX["Calories"]]
+
+    @property
+    def protein(self):
+        return self.nutrients[:, NUTRIENT_INDEX["Protein"]]
+
+    def nutrient(self, index, name):
+        return self.nutrients[index, NUTRIENT_INDEX[name]].item()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        calories, protein = self.nutrients[index].tolist()
+        return Recipe(int(self.ids[index]), self.titles[index], self.urls[index], calories, protein)
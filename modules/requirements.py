@@ -0,0 +1,106 @@
+# modules/requirements.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from requests import RequestException
+
+from modules.dietcraft import DietCraft
+
+# User settings the calorie/protein requirements depend on
+SETTINGS_FIELDS = (
+    "age", "gender", "height_feet", "height_inches", "current_weight",
+    "desired_weight", "activity_level", "time_frame", "goal",
+)
+
+# "local" computes requirements in-process; "calculator.net" scrapes the calculator.net page
+CALORIE_SOURCE = os.getenv("CALORIE_SOURCE", "local")
+
+MEMO_SIZE = 4096
+_memo = OrderedDict()  # fingerprint -> (calorie_requirement, protein_requirement)
+_memo_lock = threading.Lock()
+
+
+def settings_fingerprint(user):
+    """Stable hash of the settings that feed the requirement calculation."""
+    values = [getattr(user, field) for field in SETTINGS_FIELDS]
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
+def compute_requirements(user, fingerprint=None):
+    """
+    Returns (calorie_requirement, protein_requirement, final) for the user's settings, memoized by
+    settings fingerprint. `final` is False for a stand-in answer (the local engine while
+    calculator.net is unreachable, or None when neither can answer), which is neither memoized
+    nor meant to be kept. Settings the local engine rejects are sent to calculator.net instead.
+    """
+    fingerprint = fingerprint or settings_fingerprint(user)
+    with _memo_lock:
+        if fingerprint in _memo:
+            _memo.move_to_end(fingerprint)
+            return (*_memo[fingerprint], True)
+
+    settings = dict(
+        age=user.age,
+        gender=user.gender,
+        height_feet=user.height_feet,
+        height_inch=user.height_inches or 0,
+        weight=user.current_weight,
+        desired_weight=user.desired_weight,
+        time_frame=user.time_frame,
+        activity=user.activity_level,
+    )
+    protein_requirement = DietCraft.generate_protein_requirements(goal=user.goal, weight=user.current_weight)
+
+    if CALORIE_SOURCE == "calculator.net":
+        try:
+            calorie_requirement = DietCraft.scrape_calorie_requirements(**settings)
+        except RequestException as e:
+            # calculator.net unreachable (or its circuit is open): answer from the local engine, uncached
+            print(f"Calorie calculator unavailable, using the local engine: {e}")
+            try:
+                return DietCraft.generate_calorie_requirements(**settings), protein_requirement, False
+            except ValueError:
+                return None, protein_requirement, False
+    else:
+        try:
+            calorie_requirement = DietCraft.generate_calorie_requirements(**settings)
+        except ValueError as e:
+            # Settings the formula can't place (no gender or activity level): ask calculator.net,
+            # which has its own defaults, the same way as with CALORIE_SOURCE=calculator.net
+            print(f"Local calorie engine can't use these settings ({e}), asking the calorie calculator")
+            try:
+                calorie_requirement = DietCraft.scrape_calorie_requirements(**settings)
+            except (RequestException, ValueError) as e:
+                print(f"Calorie calculator unavailable: {e}")
+                return None, protein_requirement, False
+    result = (calorie_requirement, protein_requirement)
+
+    with _memo_lock:
+        _memo[fingerprint] = result
+        if len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return (*result, True)
+
+
+def current_requirements(user):
+    """
+    Returns (calorie_requirement, protein_requirement, changed).
+
+    The snapshot stored on the user is served as-is while its fingerprint matches the current
+    settings. Otherwise the requirements are recomputed and written onto the user, and `changed`
+    is True so the caller knows to commit. A stand-in answer is written without the fingerprint,
+    so the requirements are computed again on the next load.
+    """
+    fingerprint = settings_fingerprint(user)
+    if user.requirements_fingerprint == fingerprint:
+        return user.calorie_requirement, user.protein_requirement, False
+
+    calorie_requirement, protein_requirement, final = compute_requirements(user, fingerprint)
+    user.calorie_requirement = calorie_requirement
+    user.protein_requirement = protein_requirement
+    if final:
+        user.requirements_fingerprint = fingerprint
+    return calorie_requirement, protein_requirement, True
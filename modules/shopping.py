@@ -0,0 +1,122 @@
+# modules/shopping.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Unit -> (base unit, factor). Mass goes to grams, volume to millilitres, counts to "piece".
+UNIT_CONVERSIONS = {
+    "g": ("g", 1.0), "gram": ("g", 1.0), "grams": ("g", 1.0),
+    "kg": ("g", 1000.0), "kilogram": ("g", 1000.0), "kilograms": ("g", 1000.0),
+    "oz": ("g", 28.3495), "ounce": ("g", 28.3495), "ounces": ("g", 28.3495),
+    "lb": ("g", 453.592), "lbs": ("g", 453.592), "pound": ("g", 453.592), "pounds": ("g", 453.592),
+    "ml": ("ml", 1.0), "milliliter": ("ml", 1.0), "milliliters": ("ml", 1.0),
+    "l": ("ml", 1000.0), "liter": ("ml", 1000.0), "liters": ("ml", 1000.0),
+    "tsp": ("ml", 4.92892), "teaspoon": ("ml", 4.92892), "teaspoons": ("ml", 4.92892),
+    "tbsp": ("ml", 14.7868), "tablespoon": ("ml", 14.7868), "tablespoons": ("ml", 14.7868),
+    "cup": ("ml", 236.588), "cups": ("ml", 236.588),
+    "fl oz": ("ml", 29.5735), "pint": ("ml", 473.176), "pints": ("ml", 473.176),
+    "quart": ("ml", 946.353), "quarts": ("ml", 946.353),
+    "": ("piece", 1.0), "piece": ("piece", 1.0), "pieces": ("piece", 1.0),
+    "serving": ("piece", 1.0), "servings": ("piece", 1.0),
+    "large": ("piece", 1.0), "medium": ("piece", 1.0), "small": ("piece", 1.0),
+}
+
+
+def plan_frame(rows):
+    """DataFrame of (day, meal_type, recipe_id) plan rows."""
+    import pandas as pd  # deferred: only the shopping list needs pandas
+
+    return pd.DataFrame(rows, columns=["day", "meal_type", "recipe_id"])
+
+
+def ingredients_frame(recipes):
+    """One row per (recipe, ingredient) from informationBulk-style recipe dicts."""
+    import pandas as pd
+
+    return pd.DataFrame(
+        [
+            {
+                "recipe_id": recipe["id"],
+                "name": (ingredient.get("nameClean") or ingredient["name"]).lower(),
+                "amount": float(ingredient.get("amount") or 0),
+                "unit": (ingredient.get("unit") or "").lower().strip().rstrip("."),
+                "aisle": ingredient.get("aisle") or "",
+            }
+            for recipe in recipes
+            for ingredient in recipe.get("extendedIngredients", [])
+        ],
+        columns=["recipe_id", "name", "amount", "unit", "aisle"],
+    )
+
+
+def normalize_units(ingredients):
+    """Converts amounts to their base unit (g / ml / piece). Unknown units are kept as they are."""
+    conversions = ingredients["unit"].map(UNIT_CONVERSIONS)
+    known = conversions.notna()
+    if not known.any():
+        return ingredients
+    ingredients = ingredients.copy()
+    ingredients.loc[known, "amount"] = ingredients.loc[known, "amount"] * conversions[known].str[1].astype(float)
+    ingredients.loc[known, "unit"] = conversions[known].str[0]
+    return ingredients
+
+
+def aggregate(plan, ingredients):
+    """
+    Totals the ingredients needed for a plan in one groupby.
+
+    :param plan: DataFrame with a recipe_id column, one row per planned meal
+    :param ingredients: Normalized ingredients_frame for the plan's recipes
+    :return: DataFrame of name, unit, amount, aisle sorted by aisle and name
+    """
+    meals_per_recipe = plan["recipe_id"].dropna().astype("int64").value_counts().rename("meals")
+    needed = ingredients.join(meals_per_recipe, on="recipe_id", how="inner")
+    needed["amount"] = needed["amount"] * needed["meals"]
+    return (
+        needed.groupby(["name", "unit"], as_index=False)
+        .agg(amount=("amount", "sum"), aisle=("aisle", "first"))
+        .round({"amount": 2})
+        .sort_values(["aisle", "name"], ignore_index=True)
+    )
+
+
+def plan_key(plan):
+    """Content hash of a plan's recipe slots, used to tell whether a cached list is still current."""
+    slots = sorted(zip(plan["day"], plan["meal_type"], plan["recipe_id"].fillna(0).astype("int64")))
+    return hashlib.sha1(repr(slots).encode()).hexdigest()
+
+
+MEMO_SIZE = 4096  # users whose shopping list ShoppingListCache keeps
+
+
+class ShoppingListCache:
+    """
+    Latest shopping list per user, valid only for the plan it was built from.
+    Holds at most `size` users; the least recently used are dropped first.
+    """
+
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._lists = OrderedDict()  # user_id -> (plan_key, list)
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._lists.get(user_id)
+            if entry is not None:
+                self._lists.move_to_end(user_id)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def set(self, user_id, key, shopping_list):
+        with self._lock:
+            self._lists[user_id] = (key, shopping_list)
+            self._lists.move_to_end(user_id)
+            if len(self._lists) > self.size:
+                self._lists.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._lists.pop(user_id, None)
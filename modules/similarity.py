@@ -0,0 +1,230 @@
+# modules/similarity.py
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+# Recipes whose token sets overlap at least this much (Jaccard) count as the same dish
+DEFAULT_THRESHOLD = 0.5
+
+# Words that say nothing about what the dish is
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "with", "of", "in", "on", "for", "to", "or", "my", "your", "style",
+    "easy", "quick", "best", "simple", "homemade", "healthy", "recipe", "delicious", "perfect",
+    "ultimate", "favorite", "classic", "minute", "minutes",
+})
+
+# Pantry staples that turn up in most recipes and would make unrelated dishes look alike
+STAPLE_INGREDIENTS = frozenset({
+    "salt", "pepper", "black pepper", "salt and pepper", "water", "oil", "olive oil", "vegetable oil",
+    "butter", "sugar", "flour", "garlic", "onion",
+})
+
+_WORD = re.compile(r"[a-z]+")
+_MAX_HASH = np.uint64(1 << 32)  # Above any 32-bit hash value
+
+
+def _singular(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "oes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def _words(text):
+    # Cached: the same titles and ingredient names come back with every plan built from a pool
+    return tuple(_singular(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1)
+
+
+def recipe_tokens(title, ingredients=()):
+    """Normalized tokens of one recipe: its title words, plus each ingredient name (staples aside) as one token."""
+    tokens = set(_words(title))
+    for name in ingredients:
+        name = " ".join(_words(name))
+        if name and name not in STAPLE_INGREDIENTS:
+            tokens.add("ingredient:" + name)
+    return tokens
+
+
+class MinHasher:
+    """Turns token sets into MinHash signatures; equal positions estimate the sets' Jaccard similarity."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)  # Odd
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+
+    def signatures(self, token_sets, chunk_size=2048):
+        """(len(token_sets), num_perm) uint64 matrix. Rows of empty token sets are all _MAX_HASH."""
+        signatures = np.full((len(token_sets), self.num_perm), _MAX_HASH, dtype=np.uint64)
+        # Chunked so the (tokens x num_perm) intermediate stays small for large pools
+        for first in range(0, len(token_sets), chunk_size):
+            chunk = token_sets[first:first + chunk_size]
+            lengths = np.fromiter((len(tokens) for tokens in chunk), dtype=np.int64, count=len(chunk))
+            if not lengths.any():
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(token.encode()) for tokens in chunk for token in tokens),
+                dtype=np.uint64, count=int(lengths.sum()),
+            )
+            # Multiply-shift hashing to 32 bits; the uint64 overflow is intended
+            permuted = (hashes[:, None] * self.a + self.b) >> np.uint64(32)
+            nonempty = np.flatnonzero(lengths)
+            starts = (np.cumsum(lengths) - lengths)[nonempty]
+            signatures[first + nonempty] = np.minimum.reduceat(permuted, starts, axis=0)
+        return signatures
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over the recipes of a pool, for finding near-duplicates without comparing
+    every pair.
+
+    Signatures are cut into `bands` bands; recipes sharing any band land in the same bucket
+    and become candidates, which are kept if their estimated Jaccard similarity reaches
+    `threshold`. Buckets are one sorted array of (band, key) codes, so a lookup is a single
+    binary search plus a check of the few candidates, whatever the pool size. The default
+    16 bands of 4 rows put the LSH cut-off near 0.5.
+
+    Buckets with more than `max_bucket` recipes are dropped: they come from a band of
+    common tokens matching across unrelated dishes, and true near-duplicates share other bands.
+    """
+
+    def __init__(self, token_sets, threshold=DEFAULT_THRESHOLD, num_perm=64, bands=16, max_bucket=64):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self.signatures = self.hasher.signatures(token_sets)
+        self.empty = np.array([not tokens for tokens in token_sets], dtype=bool)
+
+        # Recipes without tokens stay out of the buckets; they are similar to nothing
+        self._codes = self._bucket_codes(self.signatures)
+        indexed = np.flatnonzero(~self.empty)
+        codes = self._codes[indexed].ravel()
+        order = np.argsort(codes, kind="stable")
+        codes, members = codes[order], np.repeat(indexed, bands)[order]
+        _, starts, sizes = np.unique(codes, return_index=True, return_counts=True)
+        keep = np.repeat(sizes <= max_bucket, sizes)
+        self._sorted_codes = codes[keep]
+        self._members = members[keep]
+
+    def _bucket_codes(self, signatures):
+        """One uint64 code per row and band: the band's values folded together, salted with the band number."""
+        rows = signatures.reshape(len(signatures), self.bands, -1)
+        codes = rows[..., 0].copy()
+        for column in range(1, rows.shape[2]):
+            codes = codes * np.uint64(1_000_003) ^ rows[..., column]
+        return codes ^ np.arange(self.bands, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+    def _lookup(self, signature, codes, exclude=None):
+        starts = np.searchsorted(self._sorted_codes, codes, "left")
+        ends = np.searchsorted(self._sorted_codes, codes, "right")
+        candidates = [self._members[start:end] for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.unique(np.concatenate(candidates))
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        similarity = np.count_nonzero(self.signatures[candidates] == signature, axis=1) / self.hasher.num_perm
+        return candidates[similarity >= self.threshold]
+
+    def similar(self, index):
+        """Indices of the recipes similar to recipe `index`, itself excluded."""
+        if self.empty[index]:
+            return np.zeros(0, dtype=np.int64)
+        return self._lookup(self.signatures[index], self._codes[index], exclude=index)
+
+    def query(self, tokens):
+        """Indices of the recipes similar to a recipe outside the index, given its tokens."""
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        signature = self.hasher.signatures([tokens])
+        return self._lookup(signature[0], self._bucket_codes(signature)[0])
+
+    def candidate_pairs(self):
+        """Every (later, earlier) pair of recipes sharing a bucket, as later * len + earlier codes, sorted."""
+        n = len(self.signatures)
+        codes = self._sorted_codes
+        pairs = []
+        # Bucket members sit next to each other, so compare each entry with the ones 1, 2, ... places on
+        for distance in range(1, len(codes)):
+            same = np.flatnonzero(codes[:-distance] == codes[distance:])
+            if not len(same):
+                break
+            a, b = self._members[same], self._members[same + distance]
+            pairs.append(np.maximum(a, b) * n + np.minimum(a, b))
+        if not pairs:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(pairs))
+
+    def families(self, chunk_size=1 << 18):
+        """
+        Groups near-duplicates: each recipe joins the first earlier recipe it is similar to that
+        started a group, or starts its own. Returns the group leader's index for every recipe.
+        """
+        n = len(self.signatures)
+        family = list(range(n))
+        pairs = self.candidate_pairs()
+        for first in range(0, len(pairs), chunk_size):
+            later, earlier = np.divmod(pairs[first:first + chunk_size], n)
+            similarity = np.count_nonzero(self.signatures[later] == self.signatures[earlier], axis=1)
+            keep = similarity / self.hasher.num_perm >= self.threshold
+            # Pairs come sorted by the later recipe, then the earlier one
+            for index, other in zip(later[keep].tolist(), earlier[keep].tolist()):
+                if family[index] == index and family[other] == other:
+                    family[index] = other
+        return np.array(family, dtype=np.int64)
+
+
+# Families of recently planned pool sets; cached pools come back with the same recipes for many users
+FAMILY_CACHE_SIZE = 256
+_family_cache = OrderedDict()
+_family_lock = threading.Lock()
+
+
+def recipe_families(stores, threshold=DEFAULT_THRESHOLD):
+    """
+    Family id for every recipe of a set of pools: the recipe id itself, or that of an earlier
+    near-duplicate. The index is built once over all pools together, so a recipe shared by two
+    pools (lunch and dinner) gets the same family in both, and the result is kept for the next
+    plan built from the same pools.
+
+    :param stores: {meal: RecipeStore}
+    :return: {meal: int64 array aligned with the store's rows}
+    """
+    key = (threshold, tuple((meal, store.ids.tobytes()) for meal, store in stores.items()))
+    with _family_lock:
+        families = _family_cache.get(key)
+        if families is not None:
+            _family_cache.move_to_end(key)
+            return families
+
+    recipes = {}  # recipe id -> tokens, first occurrence across pools
+    for store in stores.values():
+        for recipe_id, title, ingredients in zip(store.ids.tolist(), store.titles, store.ingredients):
+            if recipe_id not in recipes:
+                recipes[recipe_id] = recipe_tokens(title, ingredients)
+
+    ids = list(recipes)
+    leaders = SimilarityIndex(list(recipes.values()), threshold).families() if ids else []
+    family_of = {recipe_id: ids[leader] for recipe_id, leader in zip(ids, leaders)}
+    families = {
+        meal: np.array([family_of[recipe_id] for recipe_id in store.ids.tolist()], dtype=np.int64)
+        for meal, store in stores.items()
+    }
+
+    with _family_lock:
+        _family_cache[key] = families
+        while len(_family_cache) > FAMILY_CACHE_SIZE:
+            _family_cache.popitem(last=False)
+    return families
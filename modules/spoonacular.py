@@ -0,0 +1,58 @@
+# modules/spoonacular.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.upstream import CircuitBreaker, QuotaTracker, UpstreamClient, make_session
+
+BASE_URL = os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com")
+COMPLEX_SEARCH_URL = f"{BASE_URL}/recipes/complexSearch"
+INFORMATION_BULK_URL = f"{BASE_URL}/recipes/informationBulk"
+
+# (connect, read) timeouts in seconds for every upstream call
+DEFAULT_TIMEOUT = (3.05, float(os.getenv("SPOONACULAR_TIMEOUT", 10)))
+MAX_WORKERS = int(os.getenv("SPOONACULAR_MAX_WORKERS", 8))
+
+# One keep-alive session for the whole process, so repeat calls reuse TCP/TLS connections
+session = make_session(pool_maxsize=MAX_WORKERS)
+
+# Shared client: merges identical concurrent queries, retries with backoff, tracks the daily
+# point budget and stops calling for a while when the API keeps failing
+client = UpstreamClient(
+    "spoonacular",
+    session=session,
+    retries=int(os.getenv("SPOONACULAR_RETRIES", 2)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("SPOONACULAR_BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.getenv("SPOONACULAR_BREAKER_RESET", 30)),
+    ),
+    quota=QuotaTracker(
+        daily_points=float(os.environ["SPOONACULAR_DAILY_POINTS"]) if "SPOONACULAR_DAILY_POINTS" in os.environ else None,
+        reserve=float(os.getenv("SPOONACULAR_QUOTA_RESERVE", 0)),
+    ),
+    timeout=DEFAULT_TIMEOUT,
+)
+
+# Bounded pool shared by all requests for fanning out upstream calls
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="spoonacular")
+
+
+def complex_search(params, timeout=DEFAULT_TIMEOUT):
+    """Runs a complexSearch query through the shared client and returns its `results` list."""
+    return client.get("complexSearch", COMPLEX_SEARCH_URL, params, timeout).json().get("results", [])
+
+
+def information_bulk(ids, api_key, timeout=DEFAULT_TIMEOUT):
+    """Fetches full recipe information (including extendedIngredients) for many ids in one call."""
+    if not ids:
+        return []
+    params = {"ids": ",".join(str(i) for i in ids), "apiKey": api_key}
+    return client.get("informationBulk", INFORMATION_BULK_URL, params, timeout).json()
+
+
+def fetch_all(fn, calls):
+    """
+    Runs fn(*args) for every entry of `calls` ({key: args}) on the shared pool.
+    Returns {key: result} once all calls are done, so the total wait is that of the slowest call.
+    """
+    futures = {key: executor.submit(fn, *args) for key, args in calls.items()}
+    return {key: future.result() for key, future in futures.items()}
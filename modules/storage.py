@@ -0,0 +1,66 @@
+# modules/storage.py
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# PRAGMAs run on every new SQLite connection, per storage profile
+PROFILES = {
+    # SQLite as it ships: rollback journal, so a writer blocks every reader until it commits
+    "default": {},
+    "production": {
+        # Readers keep reading the last committed snapshot while a writer appends to the WAL
+        "journal_mode": "WAL",
+        # With WAL, NORMAL can lose the last commits on power loss but never corrupts the file
+        "synchronous": "NORMAL",
+        # Wait up to this many ms for the write lock instead of raising "database is locked"
+        "busy_timeout": 5000,
+        # Page cache per connection; negative values are in KiB
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def engine_options(uri, pool_size=10, max_overflow=5, pool_timeout=10):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for serving from several threads (request threads plus the
+    /generate workers). In-memory SQLite keeps SQLAlchemy's single-connection pool.
+
+    :param pool_size: Connections kept open; size it to request threads + generation workers
+    :param pool_timeout: Seconds a thread waits for a free connection before failing
+    """
+    backend = make_url(uri).get_backend_name()
+    if backend == "sqlite" and not is_sqlite_file(uri):
+        return {}
+    options = {"pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": pool_timeout}
+    if backend != "sqlite":
+        # Server databases drop idle connections; SQLite files don't
+        options["pool_pre_ping"] = True
+    return options
+
+
+def configure_engine(engine, profile="production"):
+    """Applies a storage profile's PRAGMAs to every connection `engine` opens. No-op for non-SQLite engines."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown storage profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    pragmas = PROFILES[profile]
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+def pragma_values(conn, names=("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store")):
+    """Current PRAGMA values on a SQLAlchemy connection, for checking which profile is in effect."""
+    return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
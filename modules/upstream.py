@@ -0,0 +1,271 @@
+# modules/upstream.py
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules import metrics
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10.0)
+
+# Responses worth retrying; any other 4xx is our own fault and fails straight away
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+# Query strings carry API keys (apiKey=...) and user data; they never go into an error message or log
+_QUERY_STRING = re.compile(r"\?[^\s'\"]*")
+
+
+def redact(text):
+    """`text` with every URL query string cut out."""
+    return _QUERY_STRING.sub("?...", str(text))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without calling the service while its circuit breaker is open."""
+
+
+class QuotaExhaustedError(requests.exceptions.RequestException):
+    """Raised without calling the service once the daily point budget is spent."""
+
+
+def make_session(pool_maxsize=10):
+    """Keep-alive session, so repeat calls reuse TCP/TLS connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class Singleflight:
+    """Runs one call per key at a time; concurrent callers with the same key share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the call in flight
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` failed calls in a row and rejects calls for `reset_timeout`
+    seconds. After that a single probe call is let through: success closes the breaker again,
+    failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_timeout else "half-open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class QuotaTracker:
+    """
+    Daily point budget of an API that reports usage in X-API-Quota-* response headers
+    (Spoonacular). The service's own count wins; until it reports one, every call counts as
+    one point against `daily_points` (None: no local limit). The budget resets at midnight UTC.
+    """
+
+    def __init__(self, daily_points=None, reserve=0):
+        self.daily_points = daily_points
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._day = time.gmtime()[:3]
+        self.used = 0.0
+        self.left = None  # Last value reported by the service, if any
+
+    @property
+    def remaining(self):
+        with self._lock:
+            if time.gmtime()[:3] != self._day:
+                self._reset()
+            if self.left is not None:
+                return self.left
+            return self.daily_points - self.used if self.daily_points is not None else float("inf")
+
+    def check(self, cost=1):
+        if self.remaining - cost < self.reserve:
+            raise QuotaExhaustedError(f"Daily quota spent ({self.remaining:.1f} points left)")
+
+    def record(self, response):
+        headers = response.headers
+        with self._lock:
+            if time.gmtime()[:3] != self._day:
+                self._reset()
+            if response.status_code == 402:  # Spoonacular's "daily points limit reached"
+                self.left = 0.0
+            elif "X-API-Quota-Used" in headers:
+                self.used = float(headers["X-API-Quota-Used"])
+                if "X-API-Quota-Left" in headers:
+                    self.left = float(headers["X-API-Quota-Left"])
+            else:
+                self.used += 1
+        return self.remaining
+
+
+class UpstreamClient:
+    """
+    GETs against one third-party service, shared by every request in the process.
+
+    - identical concurrent calls (same URL and params) are merged into one (singleflight)
+    - connection errors, timeouts, 429 and 5xx are retried with full-jitter exponential backoff
+    - calls that still fail after their retries count towards the circuit breaker, which then
+      fails fast with CircuitOpenError so callers can fall back (e.g. to stale cached data)
+    - with a `quota`, calls fail fast with QuotaExhaustedError once the daily budget is spent
+    Every call is recorded in the upstream metrics.
+    """
+
+    def __init__(self, service, session=None, retries=2, backoff=0.25, max_backoff=4.0, breaker=None,
+                 quota=None, timeout=DEFAULT_TIMEOUT):
+        self.service = service
+        self.session = session or make_session()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.quota = quota
+        self.timeout = timeout
+        self._flight = Singleflight()
+
+    def get(self, endpoint, url, params=None, timeout=None):
+        """
+        :param endpoint: Short name of the endpoint, used as the metrics label
+        :return: The requests.Response (shared with coalesced callers, so treat it as read-only)
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        response, coalesced = self._flight.do(key, lambda: self._get(endpoint, url, params, timeout or self.timeout))
+        if coalesced:
+            metrics.inc("dietcraft_upstream_coalesced_total", service=self.service, endpoint=endpoint)
+        return response
+
+    def _get(self, endpoint, url, params, timeout):
+        if self.quota is not None:
+            try:
+                self.quota.check()
+            except QuotaExhaustedError:
+                metrics.inc("dietcraft_upstream_rejected_total", service=self.service, reason="quota")
+                raise
+        if not self.breaker.allow():
+            metrics.inc("dietcraft_upstream_rejected_total", service=self.service, reason="circuit_open")
+            raise CircuitOpenError(f"{self.service} circuit breaker is open")
+
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+            except RETRY_ERRORS as e:
+                metrics.record_upstream(self.service, endpoint, "error", 0, time.perf_counter() - started)
+                error = e
+            except requests.exceptions.RequestException as e:
+                metrics.record_upstream(self.service, endpoint, "error", 0, time.perf_counter() - started)
+                self.breaker.record_failure()
+                raise self._error(endpoint, e) from e
+            else:
+                metrics.record_upstream(
+                    self.service, endpoint, response.status_code, len(response.content), time.perf_counter() - started
+                )
+                if self.quota is not None:
+                    left = self.quota.record(response)
+                    if left != float("inf"):
+                        metrics.set_gauge("dietcraft_upstream_quota_points_left", left, service=self.service)
+                if response.status_code not in RETRY_STATUSES:
+                    # A 4xx means the request was bad, not that the service is down
+                    self.breaker.record_success()
+                    if response.status_code >= 400:
+                        raise self._error(endpoint, response=response)
+                    return response
+                error = self._error(endpoint, response=response)
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt < self.retries:
+                metrics.inc("dietcraft_upstream_retries_total", service=self.service, endpoint=endpoint)
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if retry_after is not None and retry_after.isdigit():
+                    delay = min(self.max_backoff, max(delay, float(retry_after)))
+                time.sleep(delay)
+
+        self.breaker.record_failure()
+        if isinstance(error, requests.exceptions.HTTPError):
+            raise error
+        raise self._error(endpoint, error) from error
+
+    def _error(self, endpoint, cause=None, response=None):
+        """
+        The exception to raise for a failed call: same type as `cause` (HTTPError for an error
+        status), with a message naming only the service and endpoint. requests' own messages
+        include the full URL, query string and API key with it, and these errors end up in front
+        of users. The details, query strings cut out, go to the server log instead.
+        """
+        if response is not None:
+            print(f"{self.service} {endpoint} failed: HTTP {response.status_code}")
+            return requests.exceptions.HTTPError(
+                f"{self.service} {endpoint} returned HTTP {response.status_code}", response=response
+            )
+        print(f"{self.service} {endpoint} failed: {redact(cause)}")
+        return type(cause)(f"{self.service} {endpoint} failed ({type(cause).__name__})")
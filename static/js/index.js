@@ -5,4 +5,35 @@ document.addEventListener("DOMContentLoaded", function() {
             message.style.display = "none";
         });
     }, 2000);
-});
\ No newline at end of file
+});
+// Poll a running meal-plan generation and reload the profile once it has finished
+document.addEventListener("DOMContentLoaded", function() {
+    const status = document.getElementById("generate-status");
+    if (!status) {
+        return;
+    }
+    const poll = function() {
+        fetch(status.dataset.statusUrl, { headers: { "Accept": "application/json" } })
+            .then(response => {
+                if (response.status === 404) {
+                    return null;
+                }
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(job => {
+                if (job === null) {
+                    // The job is gone (or was never ours); stop polling rather than pretend it finished
+                    status.textContent = "Could not follow your meal plan generation. Refresh the page in a moment to see your plan.";
+                } else if (job.status === "queued" || job.status === "running") {
+                    setTimeout(poll, 1000);
+                } else {
+                    window.location.reload();
+                }
+            })
+            .catch(() => setTimeout(poll, 3000));
+    };
+    setTimeout(poll, 1000);
+});
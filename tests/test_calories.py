@@ -0,0 +1,195 @@
+"""
+The local calorie engine (modules/calories.py) against the calculator.net scrape.
+
+The pages in tests/fixtures/calculator are SYNTHETIC: they copy the layout of calculator.net's
+result page, but their figures were generated with the local engine's formula, not recorded
+from the live site. So this is not a parity check with calculator.net. What it does check is
+the scrape's handling of the page: which table and which row it picks for the loss and gain
+tables, every lbs_per_week band and its edges, no change in weight and no time frame. Both
+DietCraft.generate_calorie_requirements and the batch API must give the same answers.
+
+To replace them with real pages from the live site, from the repository root:
+python -m tests.test_calories --record
+"""
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from modules import dietcraft
+from modules.dietcraft import DietCraft
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "calculator")
+
+# Fixture page -> profile (age, gender, height_feet, height_inch, weight, activity)
+PAGES = {
+    "male-30-5ft10-180lb-moderate": (30, "male", 5, 10, 180, "moderate"),
+    "female-45-5ft4-150lb-light": (45, "female", 5, 4, 150, "light"),
+    "male-22-6ft1-140lb-active": (22, "male", 6, 1, 140, "active"),
+    "female-60-5ft2-200lb-sedentary": (60, "female", 5, 2, 200, "sedentary"),
+}
+
+TIME_FRAME = 10  # weeks; a change of N lbs is N / 10 lbs per week
+
+# (lbs of change, row of the page the scrape should pick, or None when the change is not suggested)
+LOSS = [
+    (1, None),                       # 0.1 lb/week
+    (2, None),                       # 0.2: lower edge, excluded
+    (3, "Mild weight loss"),
+    (8, "Mild weight loss"),         # 0.8: upper edge of the mild band
+    (9, "Weight loss"),
+    (18, "Weight loss"),             # 1.8
+    (19, "Extreme weight loss"),
+    (24, "Extreme weight loss"),
+    (25, None),                      # 2.5: excluded
+    (40, None),
+]
+GAIN = [
+    (1, None),
+    (2, None),
+    (3, "Mild weight gain"),
+    (8, "Mild weight gain"),
+    (9, "Weight gain"),
+    (18, "Weight gain"),
+    (19, "Fast Weight gain"),
+    (24, "Fast Weight gain"),
+    (25, None),
+    (40, None),
+]
+
+
+def page_query(url):
+    query = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    return tuple(query[k] for k in ("cage", "csex", "cheightfeet", "cheightinch", "cpound"))
+
+
+def read_page(name):
+    with open(os.path.join(FIXTURES, f"{name}.html"), "rb") as f:
+        return f.read()
+
+
+def page_calories(name, label):
+    """Calories/day the page gives in the row labelled `label`."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(read_page(name), "html.parser")
+    for row in soup.find_all("tr"):
+        title = row.find("div", class_="bigtext")
+        if title is not None and title.text.strip() == label:
+            return int(row.find("div", class_="verybigtext").text.strip().replace(",", ""))
+    raise KeyError(label)
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def calculator_pages(monkeypatch):
+    """Serves the fixture pages in place of calculator.net; records the URLs requested."""
+    by_query = {
+        (str(age), gender[0], str(feet), str(inch), str(weight)): name
+        for name, (age, gender, feet, inch, weight, _) in PAGES.items()
+    }
+    requested = []
+
+    def get(endpoint, url, **kwargs):
+        requested.append(url)
+        return _Response(read_page(by_query[page_query(url)]))
+
+    monkeypatch.setattr(dietcraft.calculator_client, "get", get)
+    return requested
+
+
+def cases():
+    for name, profile in PAGES.items():
+        weight = profile[4]
+        for change, label in LOSS:
+            yield pytest.param(name, weight - change, TIME_FRAME, label, id=f"{name}-lose-{change}")
+        for change, label in GAIN:
+            yield pytest.param(name, weight + change, TIME_FRAME, label, id=f"{name}-gain-{change}")
+        yield pytest.param(name, weight, TIME_FRAME, None, id=f"{name}-same-weight")
+        yield pytest.param(name, weight - 5, 0, None, id=f"{name}-lose-no-time-frame")
+        yield pytest.param(name, weight + 5, 0, None, id=f"{name}-gain-no-time-frame")
+        yield pytest.param(name, weight, 0, None, id=f"{name}-same-weight-no-time-frame")
+
+
+CASES = list(cases())
+
+
+@pytest.mark.parametrize("name,desired_weight,time_frame,label", CASES)
+def test_engine_agrees_with_scrape(calculator_pages, name, desired_weight, time_frame, label):
+    age, gender, feet, inch, weight, activity = PAGES[name]
+    settings = dict(age=age, gender=gender, height_feet=feet, height_inch=inch, weight=weight,
+                    desired_weight=desired_weight, time_frame=time_frame, activity=activity)
+
+    scraped = DietCraft.scrape_calorie_requirements(**settings)
+    assert calculator_pages, "the scrape did not request a page"
+    assert scraped == (page_calories(name, label) if label else None)
+    assert DietCraft.generate_calorie_requirements(**settings) == scraped
+
+
+def test_batch_agrees_with_scrape(calculator_pages):
+    params = [p.values for p in CASES]
+    profiles = [PAGES[name] + (desired_weight, time_frame) for name, desired_weight, time_frame, _ in params]
+    age, gender, feet, inch, weight, activity, desired_weight, time_frame = map(list, zip(*profiles))
+
+    batch = DietCraft.generate_calorie_requirements_batch(age, gender, feet, inch, weight, desired_weight,
+                                                         time_frame, activity)
+
+    scraped = [
+        DietCraft.scrape_calorie_requirements(*profile[:5], desired_weight=profile[6], time_frame=profile[7],
+                                              activity=profile[5])
+        for profile in profiles
+    ]
+    expected = np.array([np.nan if value is None else value for value in scraped], dtype=float)
+    np.testing.assert_array_equal(batch, expected)
+
+
+@pytest.mark.parametrize("gender", [None, "", "other"])
+def test_unknown_gender_is_rejected(gender):
+    with pytest.raises(ValueError, match="gender"):
+        DietCraft.generate_calorie_requirements(30, gender, 5, 10, 180, 170, 10, "moderate")
+
+
+@pytest.mark.parametrize("activity", [None, "", "extreme", 0])
+def test_unknown_activity_is_rejected(activity):
+    with pytest.raises(ValueError, match="activity"):
+        DietCraft.generate_calorie_requirements(30, "male", 5, 10, 180, 170, 10, activity)
+
+
+def test_batch_rejects_unknown_gender():
+    with pytest.raises(ValueError, match="gender"):
+        DietCraft.generate_calorie_requirements_batch([30, 30], ["male", None], [5, 5], [10, 10], [180, 180],
+                                                      [170, 170], [10, 10], ["moderate", "moderate"])
+
+
+def record():
+    """Downloads every page in PAGES from calculator.net (CALCULATOR_URL) into the fixtures directory."""
+    original = dietcraft.calculator_client.get
+    for name, (age, gender, feet, inch, weight, activity) in PAGES.items():
+        pages = []
+
+        def get(endpoint, url, **kwargs):
+            response = original(endpoint, url, **kwargs)
+            pages.append(response.content)
+            return response
+
+        dietcraft.calculator_client.get = get
+        try:
+            DietCraft.scrape_calorie_requirements(age, gender, feet, inch, weight, weight, 1, activity)
+        finally:
+            dietcraft.calculator_client.get = original
+        with open(os.path.join(FIXTURES, f"{name}.html"), "wb") as f:
+            f.write(pages[-1])
+        print(f"Recorded {name}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--record"]:
+        record()
+    else:
+        print(__doc__)
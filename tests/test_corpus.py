@@ -0,0 +1,58 @@
+"""The corpus search gives every requested dish type its share and samples the whole calorie window."""
+import json
+
+import pytest
+
+from modules.corpus import RecipeCorpus
+
+
+def recipe(recipe_id, dish_type, calories):
+    return {
+        "id": recipe_id,
+        "title": f"{dish_type} {recipe_id}",
+        "dishTypes": [dish_type],
+        "nutrition": {"nutrients": [{"name": "Calories", "amount": calories}, {"name": "Protein", "amount": 30}]},
+    }
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    # 300 recipes of each type, at 400..699 kcal
+    dump = tmp_path / "recipes.jsonl"
+    with open(dump, "w") as f:
+        for i in range(300):
+            f.write(json.dumps(recipe(i + 1, "main course", 400 + i)) + "\n")
+            f.write(json.dumps(recipe(1000 + i + 1, "salad", 400 + i)) + "\n")
+    corpus = RecipeCorpus(str(tmp_path / "corpus.db"))
+    corpus.load_jsonl(str(dump))
+    yield corpus
+    corpus.close()
+
+
+def calories(result):
+    return next(n["amount"] for n in result["nutrition"]["nutrients"] if n["name"] == "Calories")
+
+
+def test_every_type_gets_its_share(corpus):
+    results = corpus.complex_search({"type": "main course,salad", "minCalories": 400, "maxCalories": 699,
+                                     "minProtein": 0, "number": 40})
+    titles = [r["title"] for r in results]
+    assert len(titles) == len(set(titles)) == 40
+    assert sum(t.startswith("main course") for t in titles) == 20
+    assert sum(t.startswith("salad") for t in titles) == 20
+
+
+@pytest.mark.parametrize("dish_type", ["main course", None])
+def test_results_span_the_calorie_window(corpus, dish_type):
+    params = {"minCalories": 400, "maxCalories": 699, "minProtein": 0, "number": 30}
+    if dish_type:
+        params["type"] = dish_type
+    results = corpus.complex_search(params)
+    values = sorted(calories(r) for r in results)
+
+    assert len(values) == 30
+    # Each third of the window is represented, not just the 30 lowest (400..429)
+    assert values[0] < 500 and values[-1] >= 600
+    assert any(500 <= v < 600 for v in values)
+    # Same query, same sample
+    assert corpus.complex_search(params) == results
@@ -0,0 +1,98 @@
+"""
+Generation jobs are shared between processes through the database: two JobQueues with their own
+engines on one SQLite file stand in for two gunicorn workers.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from app import GenerationJob
+from modules import jobs
+from modules.jobs import JobQueue
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two (engine, queue) pairs over the same database, as two worker processes would have."""
+    uri = f"sqlite:///{tmp_path / 'jobs.db'}"
+    engines = [create_engine(uri), create_engine(uri)]
+    GenerationJob.metadata.create_all(engines[0], tables=[GenerationJob.__table__])
+    yield [(engine, JobQueue(GenerationJob)) for engine in engines]
+    for engine in engines:
+        engine.dispose()
+
+
+def wait_for(queue, engine, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(engine, job_id)
+        if not job.pending:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_status_is_visible_from_another_worker(workers):
+    (engine_a, queue_a), (engine_b, queue_b) = workers
+    release = threading.Event()
+
+    job = queue_a.submit(engine_a, 1, release.wait)
+    assert queue_b.get(engine_b, job.id).pending
+
+    release.set()
+    assert wait_for(queue_b, engine_b, job.id).status == jobs.DONE
+
+
+def test_double_submit_across_workers_runs_one_job(workers):
+    (engine_a, queue_a), (engine_b, queue_b) = workers
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        release.wait()
+
+    first = queue_a.submit(engine_a, 1, generate)
+    second = queue_b.submit(engine_b, 1, generate)
+    other_user = queue_b.submit(engine_b, 2, lambda: None)
+    assert second.id == first.id
+    assert other_user.id != first.id
+
+    release.set()
+    wait_for(queue_a, engine_a, first.id)
+    assert len(calls) == 1
+
+    # Once the job has finished, the next submit starts a new one
+    assert queue_b.submit(engine_b, 1, lambda: None).id != first.id
+
+
+def test_failure_is_reported(workers):
+    (engine_a, queue_a), (engine_b, queue_b) = workers
+
+    def fail():
+        raise jobs.JobError("no recipes")
+
+    def crash():
+        raise KeyError("https://api.example.com/recipes?apiKey=secret")
+
+    job = queue_a.submit(engine_a, 1, fail)
+    finished = wait_for(queue_b, engine_b, job.id)
+    assert (finished.status, finished.error) == (jobs.FAILED, "no recipes")
+
+    # Anything else is logged, not shown
+    job = queue_a.submit(engine_a, 1, crash)
+    finished = wait_for(queue_b, engine_b, job.id)
+    assert (finished.status, finished.error) == (jobs.FAILED, "Unexpected error")
+
+
+def test_job_lost_with_its_worker_fails_instead_of_blocking(workers):
+    (engine, queue), _ = workers
+    # A job left running by a worker that died ten minutes ago
+    with engine.begin() as conn:
+        conn.execute(insert(GenerationJob).values(id="lost", key=1, status=jobs.RUNNING,
+                                                  created_at=time.time() - queue.stale_seconds - 1))
+
+    assert queue.get(engine, "lost").status == jobs.FAILED
+    assert queue.submit(engine, 1, lambda: None).id != "lost"
@@ -0,0 +1,56 @@
+"""Metrics of several worker processes are summed through METRICS_DIR."""
+import multiprocessing
+
+import pytest
+
+from modules import metrics
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    metrics.reset()
+    yield tmp_path
+    metrics.reset()
+
+
+def worker(requests, quota_left):
+    metrics.worker_started()
+    for _ in range(requests):
+        metrics.inc("dietcraft_upstream_retries_total", service="spoonacular", endpoint="complexSearch")
+        metrics.observe("dietcraft_http_request_seconds", 0.02, endpoint="main.profile", method="GET")
+    metrics.set_gauge("dietcraft_upstream_quota_points_left", quota_left, service="spoonacular")
+    metrics.flush()
+
+
+def run_workers(*args):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=worker, args=a) for a in args]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+
+def test_render_sums_every_worker(shared_dir):
+    metrics.inc("dietcraft_profiles_written_total", target="master")  # Not inherited by the workers
+    run_workers((3, 120), (5, 110))
+    metrics.reset()
+
+    text = metrics.render()
+    assert 'dietcraft_upstream_retries_total{endpoint="complexSearch",service="spoonacular"} 8' in text
+    assert 'dietcraft_http_request_seconds_count{endpoint="main.profile",method="GET"} 8' in text
+    assert 'dietcraft_upstream_quota_points_left{service="spoonacular"} 110' in text
+    assert "dietcraft_profiles_written_total" not in text
+
+
+def test_counts_of_exited_workers_are_kept(shared_dir):
+    run_workers((2, 100))
+    run_workers((4, 90))  # A replacement worker, e.g. after a crash
+
+    assert 'dietcraft_upstream_retries_total{endpoint="complexSearch",service="spoonacular"} 6' in metrics.render()
+
+    metrics.clear_dir()
+    assert "dietcraft_upstream_retries_total" not in metrics.render()
@@ -0,0 +1,20 @@
+from modules.plans import RenderedPlanCache
+
+
+def test_rendered_plans_are_bounded_least_recently_used_first():
+    cache = RenderedPlanCache(size=2)
+    cache.set(1, 1, "plan 1")
+    cache.set(2, 1, "plan 2")
+    assert cache.get(1, 1) == "plan 1"  # user 2 is now the least recently used
+
+    cache.set(3, 1, "plan 3")
+    assert cache.get(2, 1) is None
+    assert (cache.get(1, 1), cache.get(3, 1)) == ("plan 1", "plan 3")
+
+
+def test_rendered_plan_is_only_served_for_its_version():
+    cache = RenderedPlanCache()
+    cache.set(1, 1, "plan 1")
+    assert cache.get(1, 2) is None
+    cache.invalidate([1])
+    assert cache.get(1, 1) is None
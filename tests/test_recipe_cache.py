@@ -0,0 +1,33 @@
+"""A stale pool served while the upstream is down is counted once, as a miss, not also as a hit."""
+import pytest
+from requests import ConnectionError
+
+from benchmarks.fakes import FakeUpstream
+from modules import spoonacular
+from modules.dietcraft import DietCraft
+from modules.recipe_cache import RecipeCache
+
+
+def unreachable(params):
+    raise ConnectionError("upstream unreachable")
+
+
+def test_stale_pool_is_counted_once(tmp_path, monkeypatch):
+    cache = RecipeCache(str(tmp_path / "recipe_cache.db"))
+    with FakeUpstream() as upstream:
+        monkeypatch.setattr(spoonacular, "COMPLEX_SEARCH_URL", f"{upstream.url}/recipes/complexSearch")
+        fresh = DietCraft.fetch_meal_pools("test-key", 2200, 150, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    cache.ttl = -1  # Everything stored is now expired
+    stale = DietCraft.fetch_meal_pools("test-key", 2200, 150, cache=cache, search=unreachable)
+
+    assert {meal: len(store) for meal, store in stale.items()} == {meal: len(store) for meal, store in fresh.items()}
+    assert (cache.hits, cache.misses) == (0, 6)
+
+
+def test_no_stale_pool_propagates_the_error(tmp_path):
+    cache = RecipeCache(str(tmp_path / "recipe_cache.db"))
+    with pytest.raises(ConnectionError):
+        DietCraft.fetch_meal_pools("test-key", 2200, 150, cache=cache, search=unreachable)
+    assert cache.hits == 0
@@ -0,0 +1,78 @@
+"""
+The local-engine answer given while calculator.net is down is not kept as the user's snapshot,
+and settings the local engine can't place are sent to calculator.net.
+"""
+from types import SimpleNamespace
+
+import pytest
+from requests import ConnectionError
+
+from modules import requirements
+from modules.dietcraft import DietCraft
+
+
+def make_user():
+    return SimpleNamespace(
+        age=30, gender="male", height_feet=5, height_inches=10, current_weight=180, desired_weight=170,
+        activity_level="moderate", time_frame=10, goal="Lose",
+        calorie_requirement=None, protein_requirement=None, requirements_fingerprint=None,
+    )
+
+
+@pytest.fixture
+def calculator(monkeypatch):
+    """Switches to CALORIE_SOURCE=calculator.net with a scrape that fails while `calculator.down`."""
+    state = SimpleNamespace(down=True, calls=0)
+
+    def scrape(**settings):
+        state.calls += 1
+        if state.down:
+            raise ConnectionError("calculator.net unreachable")
+        return 1999
+
+    monkeypatch.setattr(requirements, "CALORIE_SOURCE", "calculator.net")
+    monkeypatch.setattr(DietCraft, "scrape_calorie_requirements", staticmethod(scrape))
+    monkeypatch.setattr(requirements, "_memo", requirements.OrderedDict())
+    return state
+
+
+def test_fallback_is_served_but_not_kept(calculator):
+    user = make_user()
+
+    calories, _, changed = requirements.current_requirements(user)
+    assert calories == DietCraft.generate_calorie_requirements(30, "male", 5, 10, 180, 170, 10, "moderate")
+    assert changed and user.calorie_requirement == calories
+    assert user.requirements_fingerprint is None
+
+    # Next load asks calculator.net again, and keeps its answer once it is back
+    calculator.down = False
+    assert requirements.current_requirements(user) == (1999, user.protein_requirement, True)
+    assert user.requirements_fingerprint == requirements.settings_fingerprint(user)
+    assert calculator.calls == 2
+
+    assert requirements.current_requirements(user) == (1999, user.protein_requirement, False)
+    assert calculator.calls == 2
+
+
+@pytest.mark.parametrize("field", ["gender", "activity_level"])
+def test_settings_the_engine_rejects_go_to_the_calculator(monkeypatch, field):
+    monkeypatch.setattr(requirements, "_memo", requirements.OrderedDict())
+    monkeypatch.setattr(DietCraft, "scrape_calorie_requirements", staticmethod(lambda **settings: 1999))
+    user = make_user()
+    setattr(user, field, None)
+
+    assert requirements.current_requirements(user) == (1999, user.protein_requirement, True)
+    assert user.requirements_fingerprint == requirements.settings_fingerprint(user)
+
+
+def test_settings_neither_can_place_are_not_kept(monkeypatch):
+    def scrape(**settings):
+        raise ValueError("A gender is required for the calorie calculator.")
+
+    monkeypatch.setattr(requirements, "_memo", requirements.OrderedDict())
+    monkeypatch.setattr(DietCraft, "scrape_calorie_requirements", staticmethod(scrape))
+    user = make_user()
+    user.gender = None
+
+    assert requirements.current_requirements(user) == (None, user.protein_requirement, True)
+    assert user.requirements_fingerprint is None
@@ -0,0 +1,38 @@
+import warnings
+
+from modules import shopping
+
+
+def recipe(recipe_id, *ingredients):
+    return {
+        "id": recipe_id,
+        "extendedIngredients": [{"name": name, "amount": amount, "unit": unit} for name, amount, unit in ingredients],
+    }
+
+
+def test_units_are_converted_to_base_units():
+    ingredients = shopping.ingredients_frame([recipe(1, ("flour", 2, "cups"), ("garlic", 1, "clove"))])
+    normalized = shopping.normalize_units(ingredients).set_index("name")
+    assert normalized.loc["garlic", "unit"] == "clove"
+    assert normalized.loc["flour", "unit"] != "cups"
+    assert normalized["amount"].dtype == float
+
+
+def test_week_without_known_units_keeps_amounts_numeric():
+    ingredients = shopping.ingredients_frame([recipe(1, ("salt", 1, "pinch"), ("garlic", 2, "clove"))])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        normalized = shopping.normalize_units(ingredients)
+    assert normalized["amount"].dtype == float
+    assert normalized["unit"].tolist() == ["pinch", "clove"]
+
+
+def test_shopping_lists_are_bounded_least_recently_used_first():
+    cache = shopping.ShoppingListCache(size=2)
+    cache.set(1, "a", ["list 1"])
+    cache.set(2, "a", ["list 2"])
+    assert cache.get(1, "a") == ["list 1"]  # user 2 is now the least recently used
+
+    cache.set(3, "a", ["list 3"])
+    assert cache.get(2, "a") is None
+    assert (cache.get(1, "a"), cache.get(3, "a")) == (["list 1"], ["list 3"])
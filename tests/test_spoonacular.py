@@ -0,0 +1,34 @@
+"""
+The per-meal recipe pools are fetched concurrently: against a local stand-in for Spoonacular
+that takes 0.3 s per response, fetch_meal_pools must take about one delay, not three.
+"""
+import time
+
+from benchmarks.fakes import FakeUpstream
+from modules import spoonacular
+from modules.dietcraft import DietCraft
+
+LATENCY = 0.3
+
+
+def test_meal_pools_are_fetched_concurrently(monkeypatch):
+    timeouts = []
+    session_get = spoonacular.session.get
+
+    def get(url, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return session_get(url, **kwargs)
+
+    monkeypatch.setattr(spoonacular.session, "get", get)
+    with FakeUpstream(latency=LATENCY) as upstream:
+        monkeypatch.setattr(spoonacular, "COMPLEX_SEARCH_URL", f"{upstream.url}/recipes/complexSearch")
+        started = time.perf_counter()
+        pools = DietCraft.fetch_meal_pools("test-key", daily_calories=2200, daily_protein=150)
+        elapsed = time.perf_counter() - started
+
+    assert sorted(pools) == ["breakfast", "dinner", "lunch"]
+    assert all(len(store) for store in pools.values())
+    assert upstream.requests == 3
+    # Serial fetches would take 3 x LATENCY
+    assert LATENCY <= elapsed < 2 * LATENCY
+    assert timeouts == [spoonacular.DEFAULT_TIMEOUT] * 3
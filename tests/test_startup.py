@@ -0,0 +1,21 @@
+"""Startup stays within its budget and leaves the heavy libraries to load on first use."""
+import os
+
+from benchmarks import check_import_time
+
+BUDGET = float(os.getenv("STARTUP_BUDGET", 1.5))  # seconds for import app + create_app()
+
+
+def test_startup_budget_and_lazy_imports(tmp_path):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}",
+        RECIPE_CACHE_PATH=str(tmp_path / "recipe_cache.db"),
+        RECIPE_BACKEND="spoonacular",
+    )
+    # Fresh interpreters, best of three to ride out a slow first run (cold disk cache)
+    best = min((check_import_time.measure(env) for _ in range(3)), key=lambda run: run["total"])
+
+    assert best["total"] <= BUDGET, f"startup took {best['total']:.3f}s, over the {BUDGET}s budget"
+    assert "pandas" not in best["loaded"]
+    assert "bs4" not in best["loaded"]
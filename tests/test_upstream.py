@@ -0,0 +1,39 @@
+"""Errors raised by UpstreamClient never carry the request's query string, where the API key is."""
+import socket
+
+import pytest
+import requests
+
+from benchmarks.fakes import FakeUpstream
+from modules.upstream import CircuitBreaker, UpstreamClient
+
+API_KEY = "secret-api-key-1234"
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(params=["4xx", "5xx after retries", "connection refused"])
+def failing_url(request):
+    if request.param == "4xx":
+        with FakeUpstream() as upstream:
+            yield f"{upstream.url}/no-such-endpoint"
+    elif request.param == "5xx after retries":
+        with FakeUpstream(error_rate=1.0) as upstream:
+            yield f"{upstream.url}/recipes/complexSearch"
+    else:
+        yield f"http://127.0.0.1:{closed_port()}/recipes/complexSearch"
+
+
+def test_api_key_is_not_in_errors_or_logs(failing_url, capsys):
+    client = UpstreamClient("spoonacular", retries=1, backoff=0, breaker=CircuitBreaker(failure_threshold=100))
+    with pytest.raises(requests.exceptions.RequestException) as raised:
+        client.get("complexSearch", failing_url, {"apiKey": API_KEY, "query": "pasta"})
+
+    assert API_KEY not in str(raised.value)
+    assert API_KEY not in repr(raised.value)
+    assert "spoonacular complexSearch" in str(raised.value)
+    assert API_KEY not in capsys.readouterr().out